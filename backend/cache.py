@@ -0,0 +1,350 @@
+"""
+In-process caches for the read endpoints and the chatbot.
+
+Responses are cached under (data version, endpoint, params). The data version is
+bumped whenever staging or the warehouse is refreshed, which invalidates every
+entry at once. Changes made outside this process (sql/load_data_to_dw.py, other
+workers) are picked up from a database-side watermark checked at most every
+DATA_WATERMARK_INTERVAL seconds. Concurrent misses for the same key share a single
+computation. The same version drives the ETag / Last-Modified validators of the
+read endpoints.
+
+Chatbot answers are cached by (language, normalized question) and also served for
+close paraphrases, found by query-embedding similarity (SemanticCache). Query
+embeddings and vector search results are cached in plain LRUCaches, the latter
+keyed by the chatbot's index version.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Entry expiry in seconds (0 disables expiry)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# How often the database watermark is compared for changes made outside the API (0 disables)
+DATA_WATERMARK_INTERVAL = float(os.getenv("DATA_WATERMARK_INTERVAL", "5"))
+
+# Chatbot answer cache: size bound, TTL (0 disables expiry) and the cosine similarity a
+# paraphrase needs to reuse a cached answer (above 1 disables paraphrase matching)
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "1000"))
+CHATBOT_CACHE_TTL = float(os.getenv("CHATBOT_CACHE_TTL", "86400"))
+CHATBOT_CACHE_SIMILARITY = float(os.getenv("CHATBOT_CACHE_SIMILARITY", "0.92"))
+# Chatbot query embeddings (by question text) and vector search results (by index version, text, k)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+
+_MISSING = object()
+
+# Distinguishes data versions of different server processes in ETags (versions restart at 1)
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+class LRUCache:
+    """Thread-safe bounded LRU cache with optional per-entry TTL (seconds)"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._get_locked(key)
+        return default if value is _MISSING else value
+
+    def _get_locked(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._set_locked(key, value)
+
+    def _set_locked(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ResponseCache(LRUCache):
+    """LRU/TTL response cache keyed by data version, with stampede protection"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: Optional[float] = RESPONSE_CACHE_TTL):
+        super().__init__(maxsize, ttl)
+        self.data_version = 1
+        self.modified_at = time.time()
+        self.watermark = None
+        self.watermark_checked_at = float("-inf")
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def bump_version(self, modified_at: Optional[float] = None) -> int:
+        """
+        Invalidate everything cached so far (call after staging/DWH changes).
+        `modified_at` is the load time of the new data when known. Last-Modified only moves
+        forward: a change without a newer load time (e.g. rows deleted outside the API) is
+        dated when it was noticed.
+        """
+        with self._lock:
+            self.data_version += 1
+            if modified_at is None or modified_at <= self.modified_at:
+                modified_at = max(time.time(), self.modified_at)
+            self.modified_at = modified_at
+            self._entries.clear()
+            return self.data_version
+
+    def claim_watermark_check(self, interval: float = DATA_WATERMARK_INTERVAL) -> bool:
+        """True for the one caller that should read the database watermark now"""
+        if interval <= 0:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self.watermark_checked_at < interval:
+                return False
+            self.watermark_checked_at = now
+            return True
+
+    def observe_watermark(self, watermark: Hashable, modified_at: Optional[float] = None) -> bool:
+        """
+        Record the database watermark and the time of the last data load (`modified_at`,
+        epoch seconds, None if unknown). The first observation dates the data by its last
+        load instead of by this process's start, so Last-Modified is the same across
+        restarts and workers. If the watermark moved since the last observation, the data
+        changed (possibly outside this process) and the version is bumped. Returns True
+        when the version was bumped.
+        """
+        with self._lock:
+            previous, self.watermark = self.watermark, watermark
+            if previous is None and modified_at is not None:
+                self.modified_at = modified_at
+        if previous is None or previous == watermark:
+            return False
+        self.bump_version(modified_at)
+        return True
+
+    def validators(self) -> Tuple[str, float]:
+        """(ETag, Last-Modified epoch seconds) of the current data version"""
+        with self._lock:
+            return etag_for(self.data_version), self.modified_at
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        return self.lookup(key, compute)[0]
+
+    def _claim(self, key: Hashable):
+        """
+        Returns (state, value-or-future, versioned key, validators) with state "hit", "lead"
+        (the caller computes) or "wait" (another caller is computing).
+        In-flight futures are concurrent.futures.Future so sync callers, async callers and
+        separate event loops can all wait on the same computation. They resolve to
+        (ok, value-or-exception), or None when the leader was cancelled.
+        """
+        with self._lock:
+            version = self.data_version
+            validators = etag_for(version), self.modified_at
+            full_key = (version, key)
+            value = self._get_locked(full_key)
+            if value is not _MISSING:
+                return "hit", value, full_key, validators
+            future = self._inflight.get(full_key)
+            if future is not None:
+                return "wait", future, full_key, validators
+            future = Future()
+            self._inflight[full_key] = future
+            return "lead", future, full_key, validators
+
+    def _finish(self, full_key: Tuple[int, Hashable], outcome):
+        """Store a leader's successful result (unless the version moved on) and wake waiters"""
+        with self._lock:
+            if outcome and outcome[0] and self.data_version == full_key[0]:
+                self._set_locked(full_key, outcome[1])
+            future = self._inflight.pop(full_key)
+        future.set_result(outcome)
+
+    @staticmethod
+    def _unwrap(outcome):
+        ok, result = outcome
+        if ok:
+            return result
+        raise result
+
+    def lookup(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, str, float]:
+        """
+        Return (value, ETag, Last-Modified) for `key`, computing the value on a miss.
+        Only one caller computes a missing key; concurrent callers wait for and share
+        its result (or exception). Results computed while the data version changed are
+        returned but not stored. The validators are those of the version the lookup
+        started under, so a client never pairs older data with a newer ETag.
+        """
+        while True:
+            state, value, full_key, validators = self._claim(key)
+            if state == "hit":
+                return (value,) + validators
+            if state == "lead":
+                break
+            outcome = value.result()
+            if outcome is not None:
+                return (self._unwrap(outcome),) + validators
+
+        try:
+            result = compute()
+        except BaseException as e:
+            self._finish(full_key, (False, e))
+            raise
+        self._finish(full_key, (True, result))
+        return (result,) + validators
+
+    async def lookup_async(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str, float]:
+        """
+        Async twin of lookup() for handlers on the event loop; `compute` is a coroutine
+        function. Waiters await the leader's outcome without holding a thread, and retry
+        (possibly becoming the leader) if the leader's request was cancelled.
+        """
+        while True:
+            state, value, full_key, validators = self._claim(key)
+            if state == "hit":
+                return (value,) + validators
+            if state == "lead":
+                break
+            outcome = await asyncio.shield(asyncio.wrap_future(value))
+            if outcome is not None:
+                return (self._unwrap(outcome),) + validators
+
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            self._finish(full_key, None)
+            raise
+        except Exception as e:
+            self._finish(full_key, (False, e))
+            raise
+        self._finish(full_key, (True, result))
+        return (result,) + validators
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["data_version"] = self.data_version
+        stats["etag"] = etag_for(self.data_version)
+        stats["watermark"] = list(self.watermark) if isinstance(self.watermark, tuple) else self.watermark
+        stats["inflight"] = len(self._inflight)
+        return stats
+
+
+class SemanticCache(LRUCache):
+    """
+    LRU/TTL cache keyed by (language, normalized text). A miss falls back to the cached
+    entry of the same language whose embedding is most similar (cosine) to the query's,
+    if that similarity reaches `threshold`. invalidate() drops everything, and a value
+    computed before an invalidation is not stored.
+    """
+
+    def __init__(self, maxsize: int = CHATBOT_CACHE_SIZE, ttl: Optional[float] = CHATBOT_CACHE_TTL,
+                 threshold: float = CHATBOT_CACHE_SIMILARITY):
+        super().__init__(maxsize, ttl)
+        self.threshold = threshold
+        self.version = 0
+        self.semantic_hits = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Case, punctuation and spacing do not change the key ("Best crop?" == "best crop")"""
+        return " ".join(re.findall(r"\w+", text.lower()))
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, language: str, text: str, embedding: Optional[Sequence[float]] = None) -> Any:
+        """Cached value for the text or its closest paraphrase, else None"""
+        key = (language, self.normalize(text))
+        with self._lock:
+            entry = self._get_locked(key)
+            if entry is not _MISSING:
+                return entry[0]
+            if embedding is None or self.threshold > 1:
+                return None
+            
+            now = time.monotonic()
+            candidates = [
+                (candidate_key, value)
+                for candidate_key, (value, expires_at) in self._entries.items()
+                if candidate_key[0] == language and value[1] is not None
+                and (expires_at is None or expires_at >= now)
+            ]
+            if not candidates:
+                return None
+            similarities = np.stack([value[1] for _, value in candidates]) @ self._unit(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            best_key, (value, _) = candidates[best]
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return value
+
+    def store(self, language: str, text: str, embedding: Optional[Sequence[float]], value: Any, version: int):
+        """Cache `value`, unless the cache was invalidated since `version` was read"""
+        # Without an embedding the entry still serves exact repeats
+        vector = self._unit(embedding) if embedding is not None else None
+        with self._lock:
+            if version != self.version:
+                return
+            self._set_locked((language, self.normalize(text)), (value, vector))
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["semantic_hits"] = self.semantic_hits
+        stats["similarity_threshold"] = self.threshold
+        stats["version"] = self.version
+        return stats
+
+
+def etag_for(version: int) -> str:
+    return f'W/"{BOOT_ID}-{version}"'
+
+
+response_cache = ResponseCache()
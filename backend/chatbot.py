@@ -3,12 +3,22 @@ Chatbot Module with RAG Pipeline using Google Gemini API and ChromaDB Vector Dat
 """
 import os
 import asyncio
-from typing import List, Dict, Optional
+import hashlib
+import threading
+from collections import Counter
+from typing import AsyncIterator, Iterable, List, Dict, Optional
 from datetime import datetime
 import chromadb
+import numpy as np
 import pandas as pd
 import google.generativeai as genai
 
+from cache import QUERY_EMBEDDING_CACHE_SIZE, RETRIEVAL_CACHE_SIZE, LRUCache, SemanticCache
+from concurrency import BoundedExecutor, Overloaded
+from embeddings import EmbeddingPool, embed_batch
+from llm_client import GeminiClient, LimitedLLMClient
+from staging import ROW_ID_COLUMN
+
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
@@ -22,14 +32,132 @@ REQUEST_TIMEOUT = int(os.getenv("CHATBOT_REQUEST_TIMEOUT", "60"))
 
 # VectorDB Configuration
 VECTORDB_PATH = os.getenv("VECTORDB_PATH", "./vectordb")
+COLLECTION_NAME = "climacrop_data"
+# Identifies the embedding function (ChromaDB default); part of the dataset fingerprint,
+# so changing it re-embeds everything
+EMBEDDING_MODEL_ID = os.getenv("EMBEDDING_MODEL_ID", "chroma-default-all-MiniLM-L6-v2")
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "100"))
+# Ids per page when scanning the whole collection for chunks to prune
+CHROMA_SCAN_SIZE = int(os.getenv("CHROMA_SCAN_SIZE", "5000"))
+# Rows read (from the CSV or staging) and indexed per DataFrame
+INDEX_FRAME_SIZE = int(os.getenv("CHATBOT_INDEX_FRAME_SIZE", "50000"))
+# Columns that identify a CSV crop record: their values (plus an occurrence number for
+# exact duplicates) form the stable row key behind its chunk ids. Staging rows are keyed
+# on their staging row id instead.
+ROW_KEY_FIELDS = ["Crop", "Variety", "district", "Soil_Type", "Season", "Year", "Temperature_Category"]
+# Part of the dataset fingerprint; bump when chunk ids, texts or metadata change shape,
+# so persisted collections are re-synced (v2: column-wise texts, staging row id keys)
+INDEX_FORMAT = "row-key-v2"
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_WORDS = CHUNK_SIZE // 5  # Approximate words (avg 5 chars/word)
+CHUNK_OVERLAP_WORDS = CHUNK_OVERLAP // 5
+
+# Fields rendered into each row's document text, in order: column -> label
+DOCUMENT_FIELDS = {
+    "Crop": "Crop",
+    "Variety": "Variety",
+    "district": "District",
+    "Season": "Season",
+    "Year": "Year",
+    "Soil_Type": "Soil Type",
+    "Temperature_Category": "Temperature Category",
+    "Fertilizer_Type": "Fertilizer Type",
+    "Recommended_Pesticide": "Recommended Pesticide",
+    "Expected_Disease": "Expected Disease",
+    "Avg_Yield_kg_per_acre": "Average Yield (kg/acre)",
+    "Avg_Price_PKR": "Average Price (PKR)",
+    "expected_revenue": "Expected Revenue",
+    "climate_score": "Climate Score",
+    "climate_effect_percent": "Climate Effect (%)",
+    "temperature": "Temperature (°C)",
+    "rainfall": "Rainfall (mm)",
+    "humidity": "Humidity (%)",
+    "N": "Nitrogen (N)",
+    "P": "Phosphorus (P)",
+    "K": "Potassium (K)",
+    "ph": "pH Level"
+}
+
+# Chunk metadata key -> column
+DOCUMENT_METADATA_FIELDS = {"crop": "Crop", "district": "district", "year": "Year", "season": "Season"}
+
+# Query embedding and vector search run on their own threads: at most VECTOR_SEARCH_WORKERS
+# at once, VECTOR_SEARCH_MAX_QUEUE more waiting, further chat requests get 503 + Retry-After
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", "4"))
+VECTOR_SEARCH_MAX_QUEUE = int(os.getenv("VECTOR_SEARCH_MAX_QUEUE", "32"))
+vector_search_executor = BoundedExecutor("vector-search", VECTOR_SEARCH_WORKERS, VECTOR_SEARCH_MAX_QUEUE)
+
+# Returned when Gemini fails; never cached
+FALLBACK_RESPONSES = {
+    "en": "I'm sorry, I couldn't generate a response. Please try again.",
+    "ur": "معذرت، میں جواب نہیں دے سکا۔ براہ کرم دوبارہ کوشش کریں۔",
+}
+
+
+class StreamInterrupted(Exception):
+    """Gemini failed after part of a streamed answer was sent (the stream ends with "error", not "done")"""
+
 
 # Global variables for VectorDB and active requests
 vector_store = None
 active_requests: Dict[str, asyncio.Task] = {}
 
 
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text, stored in its metadata: unchanged chunks are never re-embedded"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def _distinct_values(df: pd.DataFrame, column: str):
+    """
+    Factorize a column and format each distinct value once -> (codes, labels, word counts).
+    Missing values get code -1, i.e. the trailing "" / 0 entry. Whole floats print without
+    ".0" (2020.0 from a nullable staging column renders and keys like 2020 from the CSV) and
+    whitespace runs in text collapse to one space, as in the chunks. Blank values count 0 words.
+    """
+    if column not in df:
+        return np.full(len(df), -1), np.array([""], dtype=object), np.zeros(1, dtype=np.int64)
+    values = df[column]
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        codes, uniques = pd.factorize(values.astype("float64"))
+        uniques = np.asarray(uniques, dtype="float64")
+        labels = uniques.astype(str).astype(object)
+        whole = np.isfinite(uniques) & (uniques % 1 == 0)
+        labels[whole] = uniques[whole].astype(np.int64).astype(str)
+        words = np.ones(len(labels), dtype=np.int64)
+    else:
+        codes, uniques = pd.factorize(values)
+        labels = np.array([" ".join(str(value).split()) for value in uniques], dtype=object)
+        words = np.array([len(label.split()) for label in labels], dtype=np.int64)
+    return codes, np.append(labels, np.array([""], dtype=object)), np.append(words, 0)
+
+
+def _format_column(df: pd.DataFrame, column: str):
+    """A column as an object array of text plus the word count of each value (0 = missing)"""
+    codes, labels, words = _distinct_values(df, column)
+    return labels[codes], words[codes]
+
+
+def _document_texts(df: pd.DataFrame):
+    """
+    Readable text of every row plus its word count. Each field's "Label: value" piece is
+    built once per distinct value and gathered per row; fields are joined with single
+    spaces, which is exactly the whitespace-collapsed form the chunks store.
+    """
+    codes, labels, label_words = _distinct_values(df, "Crop")
+    known = label_words > 0
+    pieces = [np.where(known, "Crop Information for " + labels + ":", "Crop Information for Unknown Crop:")[codes].tolist()]
+    words = (3 + np.where(known, label_words, 2))[codes]
+    for column, label in DOCUMENT_FIELDS.items():
+        codes, labels, label_words = _distinct_values(df, column)
+        present = label_words > 0
+        pieces.append(np.where(present, f" {label}: " + labels, "")[codes].tolist())
+        words = words + np.where(present, len(label.split()) + label_words, 0)[codes]
+    # One join per row instead of re-copying the growing text for every field
+    return np.array(["".join(parts) for parts in zip(*pieces)], dtype=object), words
+
+
 class ChatbotRAG:
     """RAG Pipeline for ClimaCrop Chatbot"""
     
@@ -39,56 +167,63 @@ class ChatbotRAG:
         self.embeddings = None
         self.model = None
         self._gemini_model = None
+        # Async LLM client behind the concurrency limit, wait queue and per-client rate limits
+        self.llm: Optional[LimitedLLMClient] = None
         self.initialized = False
+        # The persisted chunks were written by another INDEX_FORMAT (staging chunks need re-indexing)
+        self.index_format_changed = False
+        # The collection mirrors the staging table (set by a full staging sync); the CSV
+        # is then no longer indexed, so no record has both CSV and staging chunks
+        self.staging_indexed = False
+        # Serializes index writes (startup sync and ingestion updates)
+        self._index_lock = threading.Lock()
+        # Answers by (language, question) and close paraphrases; cleared when the index changes
+        self.answer_cache = SemanticCache()
+        # Bumped whenever indexing changes chunk content; part of every retrieval cache key
+        self.index_version = 0
+        # Question text -> embedding (the embedding model is fixed for the process lifetime)
+        self.query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+        # (index version, question text, k) -> top-k documents
+        self.retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
         
-    def initialize(self):
-        """Initialize the RAG pipeline - Load CSV, create embeddings, and setup VectorDB"""
+    def initialize(self, index_csv: bool = True):
+        """
+        Initialize the RAG pipeline - Load CSV, create embeddings, and setup VectorDB
+        index_csv=False: staging is the source of the index (main.py mirrors it), so the
+        CSV is not indexed and the collection is used as is
+        """
         try:
             print("🔄 Initializing Chatbot RAG Pipeline...")
             
-            # Load and process CSV data
-            documents = self._load_csv_to_documents()
-            print(f"✅ Loaded {len(documents)} documents from CSV")
-            
-            # Split documents into chunks manually
-            splits = self._split_documents(documents)
-            print(f"✅ Split into {len(splits)} chunks")
-            
-            # Create or load VectorDB using ChromaDB's default embedding
+            # Reuse the persisted collection when the dataset is unchanged; otherwise
+            # re-embed only the chunks whose content hash changed
             client = chromadb.PersistentClient(path=VECTORDB_PATH)
-            
-            # Try to delete existing collection if it exists, then create fresh one
-            try:
-                client.delete_collection(name="climacrop_data")
-                print("🔄 Cleared existing collection")
-            except:
-                pass
-            
-            collection = client.create_collection(
-                name="climacrop_data",
+            collection = client.get_or_create_collection(
+                name=COLLECTION_NAME,
                 metadata={"description": "ClimaCrop crop data for RAG"}
             )
+            self.vector_store = collection
             
-            # Add documents to ChromaDB
-            texts = [doc["content"] for doc in splits]
-            metadatas = [doc["metadata"] for doc in splits]
-            ids = [f"doc_{i}" for i in range(len(splits))]
-            
-            # Add in batches to avoid memory issues
-            batch_size = 100
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i+batch_size]
-                batch_metadatas = metadatas[i:i+batch_size]
-                batch_ids = ids[i:i+batch_size]
-                
-                collection.add(
-                    documents=batch_texts,
-                    metadatas=batch_metadatas,
-                    ids=batch_ids
-                )
+            csv_abs_path = self._resolve_csv_path()
+            fingerprint = self._dataset_fingerprint(csv_abs_path) if csv_abs_path else None
+            stored_fingerprint = (collection.metadata or {}).get("fingerprint")
+            self.index_format_changed = (
+                collection.count() > 0 and (collection.metadata or {}).get("index_format") != INDEX_FORMAT
+            )
+            self.staging_indexed = (collection.metadata or {}).get("source") == "staging"
             
-            self.vector_store = collection
-            print(f"✅ Created ChromaDB collection with {len(splits)} chunks")
+            if not index_csv:
+                print(f"✅ Using ChromaDB collection with {collection.count()} chunks (indexed from staging, CSV skipped)")
+            elif (collection.count() > 0 and not self.staging_indexed
+                  and (fingerprint is None or fingerprint == stored_fingerprint)):
+                if fingerprint is None:
+                    print("⚠️ CSV not found - using the existing ChromaDB collection as is")
+                print(f"✅ Reusing ChromaDB collection with {collection.count()} chunks (dataset unchanged)")
+            else:
+                # The CSV takes over from staging: the index mirrors it, staging chunks included
+                self._sync_collection(collection, csv_abs_path, fingerprint, mirror=self.staging_indexed)
+            if self.index_format_changed:
+                collection.modify(metadata={**(collection.metadata or {}), "index_format": INDEX_FORMAT})
             
             # Initialize Gemini API
             model_name = GEMINI_MODEL
@@ -105,6 +240,7 @@ class ChatbotRAG:
                 )
                 # Test API with a short generation
                 self._gemini_model.generate_content("Say OK")
+                self.llm = LimitedLLMClient(GeminiClient(self._gemini_model))
                 self.model = model_name
                 print(f"✅ Gemini model '{model_name}' initialized successfully")
             except Exception as e:
@@ -130,149 +266,314 @@ class ChatbotRAG:
             
             # Simple text splitting
             words = content.split()
-            chunk_size_words = CHUNK_SIZE // 5  # Approximate words (avg 5 chars/word)
-            overlap_words = CHUNK_OVERLAP // 5
             
-            for i in range(0, len(words), chunk_size_words - overlap_words):
-                chunk_words = words[i:i + chunk_size_words]
+            for n, i in enumerate(range(0, len(words), CHUNK_WORDS - CHUNK_OVERLAP_WORDS)):
+                chunk_words = words[i:i + CHUNK_WORDS]
                 chunk_text = " ".join(chunk_words)
                 
                 if chunk_text.strip():
                     splits.append({
+                        "id": f"{metadata['row_key']}:{n}",
                         "content": chunk_text,
-                        "metadata": {**metadata, "chunk_index": len(splits)}
+                        "metadata": {**metadata, "chunk_index": n, "content_hash": content_hash(chunk_text)}
                     })
         
         return splits
     
-    def _load_csv_to_documents(self) -> List[Dict]:
-        """Load CSV file and convert to documents"""
-        documents = []
-        
-        try:
-            # Try to read CSV file
-            csv_abs_path = os.path.abspath(self.csv_path)
-            if not os.path.exists(csv_abs_path):
-                # Try alternative paths
-                alternative_paths = [
-                    "./all_crops_validated.csv",
-                    "../all_crops_validated.csv",
-                    os.path.join(os.path.dirname(__file__), "../all_crops_validated.csv")
-                ]
-                for alt_path in alternative_paths:
-                    if os.path.exists(alt_path):
-                        csv_abs_path = os.path.abspath(alt_path)
-                        break
-                else:
-                    raise FileNotFoundError(f"CSV file not found at {self.csv_path}")
-            
+    def _resolve_csv_path(self) -> Optional[str]:
+        """Absolute path of the crop CSV, or None if it cannot be found"""
+        candidates = [
+            self.csv_path,
+            "./all_crops_validated.csv",
+            "../all_crops_validated.csv",
+            os.path.join(os.path.dirname(__file__), "../all_crops_validated.csv")
+        ]
+        for path in candidates:
+            if os.path.exists(path):
+                return os.path.abspath(path)
+        print(f"❌ CSV file not found at {self.csv_path}")
+        return None
+    
+    def _dataset_fingerprint(self, csv_abs_path: str) -> str:
+        """Hash of the CSV bytes plus everything that shapes the chunks and their vectors"""
+        digest = hashlib.sha256()
+        digest.update(f"{INDEX_FORMAT}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:{EMBEDDING_MODEL_ID}:".encode())
+        with open(csv_abs_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _sync_collection(self, collection, csv_abs_path: Optional[str], fingerprint: Optional[str],
+                         mirror: bool = False):
+        """
+        Bring the collection in line with the CSV: changed rows are re-embedded and CSV
+        chunks whose rows disappeared are removed. Rows added by uploads are kept, unless
+        mirror=True (every chunk not from the CSV is removed).
+        """
+        frames = pd.read_csv(csv_abs_path, chunksize=INDEX_FRAME_SIZE) if csv_abs_path else []
+        if csv_abs_path:
             print(f"📖 Reading CSV from: {csv_abs_path}")
-            
-            # Read CSV with pandas for better handling
-            df = pd.read_csv(csv_abs_path)
-            
-            # Convert each row to a document
-            for idx, row in df.iterrows():
-                # Create a readable text representation of the row
-                doc_text = self._row_to_text(row)
+        stats = self.index_frames(frames, source="csv", prune=True, prune_sources=None if mirror else ["csv"])
+        
+        if fingerprint:
+            collection.modify(metadata={
+                "description": "ClimaCrop crop data for RAG",
+                "fingerprint": fingerprint,
+                "index_format": INDEX_FORMAT
+            })
+            self.staging_indexed = False
+        print(f"✅ ChromaDB collection synced: {stats['rows']} rows, {stats['chunks']} chunks, "
+              f"{stats['embedded']} embedded, {stats['removed']} removed")
+    
+    def mark_staging_indexed(self):
+        """Record that the collection now mirrors staging (called after a full staging sync)"""
+        collection = self.vector_store
+        collection.modify(metadata={**(collection.metadata or {}), "source": "staging", "index_format": INDEX_FORMAT})
+        self.staging_indexed = True
+    
+    def index_frames(self, frames: Iterable[pd.DataFrame], source: str, prune: bool = False,
+                     prune_sources: Optional[List[str]] = None) -> Dict:
+        """
+        Upsert the chunks of crop rows (DataFrames with the CSV / staging columns).
+        Chunk ids come from row keys, so a re-indexed row overwrites its own chunks, and
+        only chunks whose content hash changed are re-embedded. Each frame's changed chunks
+        are embedded together across the embedding worker pool (see embeddings.py).
+        prune=False: incremental - only the given rows are touched.
+        prune=True: mirror - chunks from `prune_sources` (every source when None) that
+        were not produced by this call are deleted, e.g. after staging was truncated.
+        """
+        collection = self.vector_store
+        stats = {"rows": 0, "chunks": 0, "embedded": 0, "removed": 0}
+        # Occurrence numbers of duplicate row keys continue across frames
+        occurrences = Counter()
+        kept_ids = set()
+        
+        with self._index_lock, EmbeddingPool() as embedder:
+            for frame in frames:
+                splits = self._frame_to_chunks(frame, source, occurrences)
+                stats["rows"] += len(frame)
+                stats["chunks"] += len(splits)
                 
-                # Create metadata
-                metadata = {
-                    "row_index": idx,
-                    "crop": str(row.get("Crop", "Unknown")),
-                    "district": str(row.get("district", "Unknown")),
-                    "year": str(row.get("Year", "Unknown")),
-                    "season": str(row.get("Season", "Unknown"))
-                }
+                changed = []
+                for i in range(0, len(splits), CHROMA_BATCH_SIZE):
+                    changed.extend(self._changed_chunks(collection, splits[i:i + CHROMA_BATCH_SIZE]))
+                self._write_chunks(collection, changed, embedder)
+                stats["embedded"] += len(changed)
                 
-                documents.append({
-                    "content": doc_text,
-                    "metadata": metadata
-                })
+                if prune:
+                    kept_ids.update(chunk["id"] for chunk in splits)
+                else:
+                    stats["removed"] += self._remove_extra_chunks(collection, splits)
             
-            return documents
+            if prune:
+                stats["removed"] += self._prune(collection, kept_ids, prune_sources)
             
-        except Exception as e:
-            print(f"❌ Error loading CSV: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+            # Cached answers and search results may rest on chunks that just changed
+            if stats["embedded"] or stats["removed"]:
+                self.index_version += 1
+                self.answer_cache.invalidate()
+        
+        return stats
     
-    def _row_to_text(self, row: pd.Series) -> str:
-        """Convert a CSV row to readable text format"""
-        text_parts = []
+    def _changed_chunks(self, collection, batch: List[Dict]) -> List[Dict]:
+        """
+        Chunks of one batch that are new or whose content changed (they need embedding);
+        chunks whose text is unchanged but metadata differs are updated in place
+        """
+        stored = collection.get(ids=[chunk["id"] for chunk in batch], include=["metadatas"])
+        stored_metadata = dict(zip(stored["ids"], stored["metadatas"]))
         
-        # Key fields to include
-        key_fields = {
-            "Crop": "Crop",
-            "Variety": "Variety",
-            "district": "District",
-            "Season": "Season",
-            "Year": "Year",
-            "Soil_Type": "Soil Type",
-            "Temperature_Category": "Temperature Category",
-            "Fertilizer_Type": "Fertilizer Type",
-            "Recommended_Pesticide": "Recommended Pesticide",
-            "Expected_Disease": "Expected Disease",
-            "Avg_Yield_kg_per_acre": "Average Yield (kg/acre)",
-            "Avg_Price_PKR": "Average Price (PKR)",
-            "expected_revenue": "Expected Revenue",
-            "climate_score": "Climate Score",
-            "climate_effect_percent": "Climate Effect (%)",
-            "temperature": "Temperature (°C)",
-            "rainfall": "Rainfall (mm)",
-            "humidity": "Humidity (%)",
-            "N": "Nitrogen (N)",
-            "P": "Phosphorus (P)",
-            "K": "Potassium (K)",
-            "ph": "pH Level"
-        }
+        changed, relabeled = [], []
+        for chunk in batch:
+            previous = stored_metadata.get(chunk["id"])
+            if previous is None or previous.get("content_hash") != chunk["metadata"]["content_hash"]:
+                changed.append(chunk)
+            elif previous != chunk["metadata"]:
+                relabeled.append(chunk)
+        
+        # Metadata-only updates keep the stored vector
+        if relabeled:
+            collection.update(
+                ids=[chunk["id"] for chunk in relabeled],
+                metadatas=[chunk["metadata"] for chunk in relabeled]
+            )
+        return changed
+    
+    def _write_chunks(self, collection, chunks: List[Dict], embedder: EmbeddingPool):
+        """Embed chunks in parallel, then upsert them with their precomputed vectors"""
+        if not chunks:
+            return
+        vectors = embedder.embed([chunk["content"] for chunk in chunks])
+        for i in range(0, len(chunks), CHROMA_BATCH_SIZE):
+            batch = chunks[i:i + CHROMA_BATCH_SIZE]
+            collection.upsert(
+                ids=[chunk["id"] for chunk in batch],
+                embeddings=vectors[i:i + CHROMA_BATCH_SIZE].tolist(),
+                documents=[chunk["content"] for chunk in batch],
+                metadatas=[chunk["metadata"] for chunk in batch]
+            )
+    
+    def _remove_extra_chunks(self, collection, splits: List[Dict]) -> int:
+        """Delete stored chunks of these rows beyond their current chunk count (a row's text got shorter)"""
+        current_ids = {chunk["id"] for chunk in splits}
+        row_keys = list({chunk["metadata"]["row_key"] for chunk in splits})
+        removed = 0
+        for i in range(0, len(row_keys), CHROMA_BATCH_SIZE):
+            stored = collection.get(where={"row_key": {"$in": row_keys[i:i + CHROMA_BATCH_SIZE]}}, include=[])
+            extra = [doc_id for doc_id in stored["ids"] if doc_id not in current_ids]
+            if extra:
+                collection.delete(ids=extra)
+                removed += len(extra)
+        return removed
+    
+    def _prune(self, collection, kept_ids: set, sources: Optional[List[str]]) -> int:
+        """Delete chunks (of `sources`, or any source) that are not in `kept_ids`"""
+        stale_ids = []
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=CHROMA_SCAN_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                # Chunks written before row keys existed carry no source and count as CSV chunks
+                chunk_source = (metadata or {}).get("source", "csv")
+                if doc_id not in kept_ids and (sources is None or chunk_source in sources):
+                    stale_ids.append(doc_id)
+            offset += len(page["ids"])
         
-        text_parts.append(f"Crop Information for {row.get('Crop', 'Unknown Crop')}:")
+        for i in range(0, len(stale_ids), CHROMA_BATCH_SIZE):
+            collection.delete(ids=stale_ids[i:i + CHROMA_BATCH_SIZE])
+        return len(stale_ids)
+    
+    def _frame_to_chunks(self, df: pd.DataFrame, source: str, occurrences: Counter) -> List[Dict]:
+        """
+        Chunks (id, content, metadata) for crop rows. Texts, word counts, row keys and
+        metadata are built column-wise; only hashing, and the rare row longer than one
+        chunk, go row by row.
+        """
+        if df.empty:
+            return []
         
-        for key, label in key_fields.items():
-            value = row.get(key)
-            if pd.notna(value) and value != "":
-                text_parts.append(f"{label}: {value}")
+        texts, words = _document_texts(df)
+        metadata = {"row_key": self._row_keys(df, source, occurrences)}
+        for name, column in DOCUMENT_METADATA_FIELDS.items():
+            values, value_words = _format_column(df, column)
+            metadata[name] = np.where(value_words > 0, values, "Unknown")
+        names = list(metadata)
         
-        return "\n".join(text_parts)
+        # Rows with at most one chunk step of words are one chunk; longer rows go through
+        # the general splitter
+        single = words <= CHUNK_WORDS - CHUNK_OVERLAP_WORDS
+        
+        columns = [metadata[name][single].tolist() for name in names]
+        chunks = [
+            {
+                "id": f"{values[0]}:0",
+                "content": content,
+                "metadata": dict(zip(names, values), source=source, chunk_index=0, content_hash=content_hash(content))
+            }
+            for content, *values in zip(texts[single].tolist(), *columns)
+        ]
+        
+        if not single.all():
+            columns = [metadata[name][~single].tolist() for name in names]
+            documents = [
+                {"content": content, "metadata": {**dict(zip(names, values)), "source": source}}
+                for content, *values in zip(texts[~single].tolist(), *columns)
+            ]
+            chunks.extend(self._split_documents(documents))
+        return chunks
     
-    async def search_relevant_context(self, query: str, k: int = 5) -> List[str]:
+    def _row_keys(self, df: pd.DataFrame, source: str, occurrences: Counter) -> np.ndarray:
+        """
+        Stable key per row. Rows with a staging row id are keyed on it, so an uploaded row
+        equal to one indexed earlier gets chunks of its own instead of overwriting that
+        row's. CSV rows: hash of their ROW_KEY_FIELDS values and occurrence number.
+        """
+        if ROW_ID_COLUMN in df:
+            raw = [f"{source}|{int(row_id)}" for row_id in df[ROW_ID_COLUMN].tolist()]
+            return np.array([hashlib.sha1(value.encode("utf-8")).hexdigest()[:24] for value in raw], dtype=object)
+        
+        parts = [_format_column(df, field)[0].tolist() for field in ROW_KEY_FIELDS]
+        joined = np.array(["|".join(values) for values in zip(*parts)], dtype=object)
+        
+        # Duplicates are numbered in order, continuing from earlier frames of the same run
+        codes, uniques = pd.factorize(joined)
+        occurrence = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+        occurrence = occurrence + np.array([occurrences[key] for key in uniques], dtype=np.int64)[codes]
+        occurrences.update(dict(zip(uniques, np.bincount(codes).tolist())))
+        
+        raw = joined + "|" + occurrence.astype(str).astype(object)
+        return np.array([hashlib.sha1(value.encode("utf-8")).hexdigest()[:24] for value in raw.tolist()], dtype=object)
+    
+    async def _embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed a question once per request (answer cache lookup and vector search share it)"""
+        embedding = self.query_embedding_cache.get(query)
+        if embedding is not None:
+            return embedding
+        try:
+            # CPU-bound ONNX inference: keep it off the event loop and the default executor
+            vectors = await vector_search_executor.run(embed_batch, [query])
+        except Overloaded:
+            raise
+        except Exception as e:
+            print(f"⚠️ Error embedding query: {e}")
+            return None
+        embedding = vectors[0].tolist()
+        self.query_embedding_cache.set(query, embedding)
+        return embedding
+    
+    async def search_relevant_context(self, query: str, k: int = 5,
+                                      query_embedding: Optional[List[float]] = None) -> List[str]:
         """Search for relevant context from VectorDB"""
         if not self.initialized or self.vector_store is None:
             return []
         
+        # Retries and hot questions skip the vector search until the index changes
+        cache_key = (self.index_version, query, k)
+        documents = self.retrieval_cache.get(cache_key)
+        if documents is not None:
+            return list(documents)
+        
         try:
-            # Use ChromaDB query (it will use default embedding function)
-            results = self.vector_store.query(
-                query_texts=[query],
-                n_results=k
-            )
+            # Blocking Chroma search runs on the vector search executor, never on the event loop.
+            # Same embedding function as the collection, so a precomputed query vector is equivalent
+            if query_embedding is not None:
+                results = await vector_search_executor.run(
+                    self.vector_store.query, query_embeddings=[query_embedding], n_results=k
+                )
+            else:
+                results = await vector_search_executor.run(
+                    self.vector_store.query, query_texts=[query], n_results=k
+                )
             
             if results and 'documents' in results and results['documents']:
-                return results['documents'][0]
+                documents = results['documents'][0]
             else:
-                return []
+                documents = []
+            self.retrieval_cache.set(cache_key, tuple(documents))
+            return documents
             
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"⚠️ Error searching VectorDB: {e}")
             import traceback
             traceback.print_exc()
             return []
     
-    async def generate_response(self, user_query: str, context: List[str], request_id: str, language: str = "en") -> str:
-        """Generate response using Google Gemini with RAG context."""
-        try:
-            # Build context prompt
-            context_text = "\n\n".join([
-                f"[Context {i+1}]\n{ctx}"
-                for i, ctx in enumerate(context)
-            ])
-            
-            # Create prompt with context - adjust based on language
-            if language == "ur":
-                # Urdu prompt - **force native Urdu script, no Roman Urdu**
-                prompt = f"""آپ ClimaCrop کے لیے ایک مددگار زرعی معاون ہیں۔ آپ مختلف طرح کے سوالات کے جواب دے سکتے ہیں:
+    def _build_prompt(self, user_query: str, context: List[str], language: str = "en") -> str:
+        """Gemini prompt for a question and its retrieved context, in the answer language"""
+        # Build context prompt
+        context_text = "\n\n".join([
+            f"[Context {i+1}]\n{ctx}"
+            for i, ctx in enumerate(context)
+        ])
+        
+        # Create prompt with context - adjust based on language
+        if language == "ur":
+            # Urdu prompt - **force native Urdu script, no Roman Urdu**
+            prompt = f"""آپ ClimaCrop کے لیے ایک مددگار زرعی معاون ہیں۔ آپ مختلف طرح کے سوالات کے جواب دے سکتے ہیں:
 
 1. زرعی سوالات: فصلوں کے ڈیٹا بیس سے معلومات استعمال کریں۔
 2. عام گفتگو: "آپ کیسے ہیں؟" جیسے سوالات کا دوستانہ اور مختصر جواب دیں۔
@@ -291,9 +592,9 @@ class ChatbotRAG:
 - اگر کسی بات کا ڈیٹا میں ذکر نہیں تو واضح طور پر لکھیں کہ "اس کے بارے میں میرے پاس موجود ڈیٹا میں معلومات نہیں" اور اندازہ نہ لگائیں۔
 
 براہ کرم حتمی جواب صرف اردو متن میں دیں، کسی قسم کی وضاحت انگریزی میں شامل نہ کریں۔"""
-            else:
-                # English prompt
-                prompt = f"""You are a helpful agricultural assistant for ClimaCrop. You can answer various types of questions:
+        else:
+            # English prompt
+            prompt = f"""You are a helpful agricultural assistant for ClimaCrop. You can answer various types of questions:
 
 1. Agricultural questions: Use the crop database context below
 2. General conversation: Answer friendly questions like "How are you?" in a warm, brief way
@@ -305,10 +606,21 @@ Context from ClimaCrop Database:
 User Question: {user_query}
 
 Keep your answer brief: 2-3 sentences. Be friendly. For weather questions, say you don't have live weather but can share typical climate and crop suitability from our data."""
-
+        
+        return prompt
+    
+    async def generate_response(self, user_query: str, context: List[str], request_id: str, language: str = "en",
+                                client_id: Optional[str] = None) -> str:
+        """
+        Generate response using Google Gemini with RAG context.
+        Raises Overloaded when `client_id` is over its rate or the LLM queue is full.
+        """
+        try:
+            prompt = self._build_prompt(user_query, context, language)
+            
             # Call Gemini API with timeout
             response = await asyncio.wait_for(
-                self._call_gemini_async(prompt, language),
+                self._call_gemini_async(prompt, language, client_id),
                 timeout=REQUEST_TIMEOUT
             )
             
@@ -316,41 +628,32 @@ Keep your answer brief: 2-3 sentences. Be friendly. For weather questions, say y
             
         except asyncio.TimeoutError:
             raise TimeoutError(f"Request timed out after {REQUEST_TIMEOUT} seconds")
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"❌ Error generating response: {e}")
             raise
     
-    async def _call_gemini_async(self, prompt: str, language: str = "en") -> str:
-        """Async wrapper for Gemini API call"""
-        loop = asyncio.get_event_loop()
-
-        def call_gemini():
-            try:
-                response = self._gemini_model.generate_content(prompt)
-                if response and response.text:
-                    return response.text.strip()
-                return ""
-            except Exception as e:
-                print(f"❌ Gemini API error: {e}")
-                if language == "ur":
-                    return "معذرت، میں جواب نہیں دے سکا۔ براہ کرم دوبارہ کوشش کریں۔"
-                else:
-                    return "I'm sorry, I couldn't generate a response. Please try again."
-
-        response_text = await loop.run_in_executor(None, call_gemini)
+    async def _call_gemini_async(self, prompt: str, language: str = "en", client_id: Optional[str] = None) -> str:
+        """Gemini call through the limited async client; Overloaded propagates, API errors fall back"""
+        try:
+            response_text = await self.llm.generate(prompt, client_id=client_id)
+        except Overloaded:
+            raise
+        except Exception as e:
+            print(f"❌ Gemini API error: {e}")
+            response_text = ""
 
         if response_text:
             return response_text
         else:
-            if language == "ur":
-                return "معذرت، میں جواب نہیں دے سکا۔ براہ کرم دوبارہ کوشش کریں۔"
-            else:
-                return "I'm sorry, I couldn't generate a response. Please try again."
+            return FALLBACK_RESPONSES.get(language, FALLBACK_RESPONSES["en"])
     
-    async def chat(self, user_query: str, request_id: str, language: str = "en") -> Dict[str, any]:
+    async def chat(self, user_query: str, request_id: str, language: str = "en",
+                   client_id: Optional[str] = None) -> Dict[str, any]:
         """
         Main chat method with deadlock prevention
-        Returns response with metadata
+        Returns response with metadata; `client_id` (e.g. the caller's IP) keys LLM rate limits
         """
         start_time = datetime.now()
         
@@ -363,7 +666,7 @@ Keep your answer brief: 2-3 sentences. Be friendly. For weather questions, say y
                     print(f"⏹️ Cancelled previous request for {request_id}")
             
             # Create new task
-            task = asyncio.create_task(self._process_chat_request(user_query, request_id, language))
+            task = asyncio.create_task(self._process_chat_request(user_query, request_id, language, client_id))
             active_requests[request_id] = task
             
             # Wait for response with timeout
@@ -394,42 +697,170 @@ Keep your answer brief: 2-3 sentences. Be friendly. For weather questions, say y
                 del active_requests[request_id]
             raise
     
-    async def _process_chat_request(self, user_query: str, request_id: str, language: str = "en") -> Dict[str, any]:
+    async def _process_chat_request(self, user_query: str, request_id: str, language: str = "en",
+                                    client_id: Optional[str] = None) -> Dict[str, any]:
         """Process a single chat request"""
+        query_embedding = await self._embed_query(user_query)
+        
+        # Repeated or paraphrased question: answer without vector search or Gemini
+        cached = self.answer_cache.lookup(language, user_query, query_embedding)
+        if cached is not None:
+            return {
+                "response": cached["response"],
+                "query": user_query,
+                "context_used": cached["context_used"],
+                "request_id": request_id,
+                "cached": True
+            }
+        cache_version = self.answer_cache.version
+        
         # Search for relevant context
-        context = await self.search_relevant_context(user_query, k=5)
+        context = await self.search_relevant_context(user_query, k=5, query_embedding=query_embedding)
         
         # Generate response
-        response = await self.generate_response(user_query, context, request_id, language)
+        response = await self.generate_response(user_query, context, request_id, language, client_id)
+        
+        # Only answers grounded in retrieved context are reused; Gemini failures never are
+        if context and response not in FALLBACK_RESPONSES.values():
+            self.answer_cache.store(
+                language, user_query, query_embedding,
+                {"response": response, "context_used": len(context)},
+                cache_version
+            )
         
         return {
             "response": response,
             "query": user_query,
             "context_used": len(context),
-            "request_id": request_id
+            "request_id": request_id,
+            "cached": False
         }
 
+    
+    async def chat_stream(self, user_query: str, request_id: str, language: str = "en",
+                          client_id: Optional[str] = None) -> AsyncIterator[Dict[str, any]]:
+        """
+        Streaming variant of chat(): yields {"event", "data"} dicts -
+        "metadata" (after retrieval), "token" (answer text as Gemini generates it), then
+        "done", or "cancelled" when a newer request with the same request_id replaced this
+        one. Gemini failing after tokens were sent raises StreamInterrupted; the whole
+        stream is bounded by REQUEST_TIMEOUT (TimeoutError).
+        Closing the generator (client disconnected) cancels the work behind it.
+        """
+        start_time = datetime.now()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REQUEST_TIMEOUT
+        
+        # Cancel previous request for this user if exists
+        old_task = active_requests.get(request_id)
+        if old_task is not None and not old_task.done():
+            old_task.cancel()
+            print(f"⏹️ Cancelled previous request for {request_id}")
+        
+        # The task pushes events and a final None; this generator relays them
+        events: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._process_chat_stream(user_query, request_id, language, client_id, events))
+        active_requests[request_id] = task
+        
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                event = await asyncio.wait_for(events.get(), timeout=remaining)
+                if event is None:
+                    break
+                yield event
+            # Re-raises the task's error
+            try:
+                summary = await task
+            except asyncio.CancelledError:
+                # Only the task was cancelled (a newer request replaced it): end the stream
+                # with a terminal event. A cancellation of this generator's own consumer propagates
+                if not task.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                yield {"event": "cancelled", "data": {"request_id": request_id, "detail": "Replaced by a newer request"}}
+                return
+            yield {
+                "event": "done",
+                "data": {**summary, "processing_time": (datetime.now() - start_time).total_seconds()}
+            }
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Chat request timed out after {REQUEST_TIMEOUT} seconds")
+        finally:
+            if not task.done():
+                task.cancel()
+            if active_requests.get(request_id) is task:
+                del active_requests[request_id]
+    
+    async def _process_chat_stream(self, user_query: str, request_id: str, language: str,
+                                   client_id: Optional[str], events: asyncio.Queue) -> Dict[str, any]:
+        """Produce chat_stream() events; returns the summary for the "done" event"""
+        try:
+            query_embedding = await self._embed_query(user_query)
+            
+            cached = self.answer_cache.lookup(language, user_query, query_embedding)
+            if cached is not None:
+                events.put_nowait({"event": "metadata", "data": {
+                    "query": user_query, "request_id": request_id,
+                    "context_used": cached["context_used"], "cached": True
+                }})
+                events.put_nowait({"event": "token", "data": {"text": cached["response"]}})
+                return {"request_id": request_id, "context_used": cached["context_used"], "cached": True}
+            cache_version = self.answer_cache.version
+            
+            context = await self.search_relevant_context(user_query, k=5, query_embedding=query_embedding)
+            events.put_nowait({"event": "metadata", "data": {
+                "query": user_query, "request_id": request_id,
+                "context_used": len(context), "cached": False
+            }})
+            
+            parts: List[str] = []
+            failed = False
+            try:
+                async for text in self.llm.stream(self._build_prompt(user_query, context, language), client_id=client_id):
+                    parts.append(text)
+                    events.put_nowait({"event": "token", "data": {"text": text}})
+            except Overloaded:
+                raise
+            except Exception as e:
+                print(f"❌ Gemini API error: {e}")
+                failed = True
+            
+            response = "".join(parts).strip()
+            if failed and response:
+                # Part of the answer is already on the client; it must not look complete
+                raise StreamInterrupted("Answer generation failed before the response was complete")
+            if not parts or not response:
+                events.put_nowait({"event": "token", "data": {"text": FALLBACK_RESPONSES.get(language, FALLBACK_RESPONSES["en"])}})
+            elif context and not failed:
+                self.answer_cache.store(
+                    language, user_query, query_embedding,
+                    {"response": response, "context_used": len(context)},
+                    cache_version
+                )
+            return {"request_id": request_id, "context_used": len(context), "cached": False}
+        finally:
+            events.put_nowait(None)
 
-# Global chatbot instance
+# Global chatbot instance (set once the RAG pipeline is fully built)
 chatbot_instance: Optional[ChatbotRAG] = None
 
 
-def get_chatbot() -> ChatbotRAG:
-    """Get or initialize chatbot instance"""
-    global chatbot_instance
-    
-    if chatbot_instance is None:
-        chatbot_instance = ChatbotRAG()
-        chatbot_instance.initialize()
-    
+def get_chatbot() -> Optional[ChatbotRAG]:
+    """Return the initialized chatbot, or None while it is still being built (never builds it)"""
     return chatbot_instance
 
 
-def initialize_chatbot():
-    """Initialize chatbot on startup"""
-    try:
-        chatbot = get_chatbot()
-        return chatbot
-    except Exception as e:
-        print(f"⚠️ Warning: Could not initialize chatbot: {e}")
-        return None
+def initialize_chatbot(index_csv: bool = True) -> ChatbotRAG:
+    """
+    Build the RAG pipeline (CSV -> ChromaDB, Gemini check) and publish it.
+    Blocking; main.py runs it on a background thread. Raises on failure so the
+    caller can report the failed state.
+    """
+    global chatbot_instance
+    
+    chatbot = ChatbotRAG()
+    chatbot.initialize(index_csv=index_csv)
+    chatbot_instance = chatbot
+    return chatbot
@@ -0,0 +1,127 @@
+"""
+Bounded executors for blocking work called from async handlers.
+
+Each BoundedExecutor owns its threads, so a burst of one kind of work (e.g. chatbot
+vector search) can neither block the event loop nor take over Starlette's threadpool
+that the SQL endpoints use. Work beyond max_workers + max_queue is rejected at once
+with Overloaded instead of queueing without bound.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+
+class Overloaded(Exception):
+    """A bounded resource is full: answer 429/503 with Retry-After instead of queueing"""
+
+    def __init__(self, message: str, retry_after: float = 1.0, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class BoundedExecutor:
+    """Thread pool with a cap on queued work and queue / latency metrics"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: float = 1.0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0  # queued + running
+        self.running = 0
+        self.max_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs); raises Overloaded when the queue is full"""
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(
+                    f"{self.name} is saturated ({self.pending} requests pending), try again shortly",
+                    self.retry_after,
+                )
+            self.pending += 1
+            self.submitted += 1
+            self.max_queued = max(self.max_queued, self.pending - self.running)
+        enqueued = time.perf_counter()
+        started_flag = []
+
+        def task():
+            started = time.perf_counter()
+            started_flag.append(True)
+            with self._lock:
+                self.running += 1
+                self.total_wait_seconds += started - enqueued
+                self.max_wait_seconds = max(self.max_wait_seconds, started - enqueued)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.pending -= 1
+                    self.completed += 1
+                    self.failed += failed
+                    self.total_run_seconds += time.perf_counter() - started
+
+        def on_done(future: Future):
+            # Cancelled while still queued (e.g. the awaiting request timed out): never ran
+            if future.cancelled() and not started_flag:
+                with self._lock:
+                    self.pending -= 1
+                    self.cancelled += 1
+
+        try:
+            future = self._executor.submit(task)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(on_done)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await fn(*args, **kwargs) on this executor; cancelling the await drops queued work"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avg_queue_wait_ms": round(self.total_wait_seconds * 1000 / self.completed, 3) if self.completed else 0.0,
+                "max_queue_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "avg_run_ms": round(self.total_run_seconds * 1000 / self.completed, 3) if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,2 @@
+# test_chatbot.py is a manual script against a running server (see TEST_CHATBOT.md), not a unit test
+collect_ignore = ["test_chatbot.py"]
@@ -0,0 +1,214 @@
+"""
+Database connection settings and connection-pool telemetry.
+
+Connection parameters and pool sizing come from the same .env variables as
+sql/load_data_to_dw.py (DB_HOST, DB_PORT, ...). Both API engines use pools that
+time every checkout, so /debug/pool-stats can show whether requests wait on
+connections and how long a checkout takes.
+"""
+import os
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# -----------------------------------
+# Connection settings
+# -----------------------------------
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_NAME = os.getenv("DB_NAME", "climacrop")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "1234")
+
+
+def db_url(driver: str) -> URL:
+    """Connection URL for a SQLAlchemy driver name, e.g. "postgresql+psycopg2" """
+    return URL.create(
+        driver,
+        username=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+    )
+
+
+DB_URL = db_url("postgresql+psycopg2")
+ASYNC_DB_URL = db_url("postgresql+asyncpg")
+
+# -----------------------------------
+# Pool settings
+# -----------------------------------
+# Sync pool: upload, pipeline jobs, debug endpoints and the threadpool fallback
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds to wait for a free connection before failing the request
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Replace connections older than this many seconds (-1 keeps them forever)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Pre-ping costs one round-trip per checkout; disable when recycle already covers stale connections
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Async pool: read endpoints
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "10"))
+ASYNC_MAX_OVERFLOW = int(os.getenv("ASYNC_MAX_OVERFLOW", "20"))
+
+# Checkout latency histogram bucket upper bounds in milliseconds (last bucket is +Inf)
+CHECKOUT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+
+class PoolTelemetry:
+    """
+    Checkout counts, failures, waiters and latency histogram for one pool. A waiter is
+    a checkout that found every connection (pool size + overflow) in use.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.failed_checkouts = 0
+            self.queued_checkouts = 0
+            self.waiting = 0
+            self.max_waiting = 0
+            self.total_wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.buckets = [0] * (len(CHECKOUT_BUCKETS_MS) + 1)
+
+    def start(self, queued: bool):
+        if not queued:
+            return
+        with self._lock:
+            self.queued_checkouts += 1
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def finish(self, seconds: float, queued: bool, failed: bool = False):
+        with self._lock:
+            if queued:
+                self.waiting -= 1
+            if failed:
+                self.failed_checkouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            millis = seconds * 1000
+            for i, bound in enumerate(CHECKOUT_BUCKETS_MS):
+                if millis <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in CHECKOUT_BUCKETS_MS] + [f">{CHECKOUT_BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self.checkouts,
+                "failed_checkouts": self.failed_checkouts,  # pool timeouts and connect errors
+                "queued_checkouts": self.queued_checkouts,  # found the pool exhausted
+                "waiting_now": self.waiting,
+                "max_waiting": self.max_waiting,
+                "total_wait_seconds": round(self.total_wait_seconds, 4),
+                "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "checkout_latency_histogram": dict(zip(labels, self.buckets)),
+            }
+
+
+POOL_TELEMETRY: Dict[str, PoolTelemetry] = {
+    "sync": PoolTelemetry("sync"),
+    "async": PoolTelemetry("async"),
+}
+
+
+class TimedPoolMixin:
+    """
+    Times QueuePool._do_get, i.e. the whole checkout: waiting for a free connection
+    plus opening a new one when the pool is below its limit. Only checkouts that start
+    with all size + overflow connections in use are counted as waiting.
+    """
+    telemetry: PoolTelemetry
+
+    def _do_get(self):
+        queued = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        self.telemetry.start(queued)
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.telemetry.finish(time.perf_counter() - started, queued, failed=True)
+            raise
+        self.telemetry.finish(time.perf_counter() - started, queued)
+        return connection
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    telemetry = POOL_TELEMETRY["sync"]
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    telemetry = POOL_TELEMETRY["async"]
+
+
+def engine_options() -> Dict:
+    """create_engine() keyword arguments for the sync engine"""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def async_engine_options() -> Dict:
+    """create_async_engine() keyword arguments for the async engine"""
+    return {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": ASYNC_POOL_SIZE,
+        "max_overflow": ASYNC_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_status(engine, name: str) -> Dict:
+    """Live pool gauges plus checkout telemetry for an engine (sync or async)"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "timeout_seconds": pool.timeout(),
+        "recycle_seconds": pool._recycle,
+        "pre_ping": pool._pre_ping,
+    }
+    # Connections still available before callers start queueing
+    status["available"] = max(0, pool.size() + pool._max_overflow - pool.checkedout())
+    status["telemetry"] = POOL_TELEMETRY[name].to_dict()
+    return status
+
+
+def pool_report(engines: List) -> Dict:
+    """pool_status() for [(name, engine)] pairs, skipping engines that are not available"""
+    return {name: pool_status(engine, name) for name, engine in engines if engine is not None}
@@ -0,0 +1,89 @@
+"""
+Embedding computation for chatbot index builds.
+
+ChromaDB embeds documents on add/upsert in the calling thread, i.e. on one core.
+Index builds instead compute vectors here, in large batches spread over a process
+pool, and hand them to Chroma as precomputed `embeddings=`. Workers use ChromaDB's
+default embedding function, the same one the collection uses to embed queries, so
+stored and query vectors stay comparable.
+
+Workers are spawned (not forked: the API process runs threads), so they import only
+this module and must never import main (or chatbot, which main builds on): keep the
+worker functions here, free of import-time side effects. A spawned process also re-imports
+the script that started its parent unless that is a package's __main__, which is why
+`python main.py` re-launches itself as `python -m uvicorn main:app`; start the API with
+`uvicorn main:app` (as START_BOTH.sh does).
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+# Worker processes for index builds; 1 embeds in the calling process
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", str(os.cpu_count() or 1)))
+# Texts per embedding call (and per task sent to a worker)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+
+# Per-process embedding function, created on first use
+_embedding_function = None
+
+
+def _get_embedding_function():
+    global _embedding_function
+    if _embedding_function is None:
+        from chromadb.utils import embedding_functions
+        _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+
+def embed_batch(texts: List[str]) -> np.ndarray:
+    """Embed one batch in this process -> float32 array of shape (len(texts), dim)"""
+    return np.asarray(_get_embedding_function()(texts), dtype=np.float32)
+
+
+def _init_worker():
+    # Load the model once per worker instead of in its first task
+    _get_embedding_function()
+
+
+class EmbeddingPool:
+    """
+    Embeds texts for an index build across EMBEDDING_WORKERS processes. The pool is
+    started on the first call that has more than one batch and shut down by close()
+    (use it as a context manager), so idle workers do not hold model memory.
+    """
+
+    def __init__(self, workers: int = EMBEDDING_WORKERS, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Vectors for `texts`, in order"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        # Small updates (e.g. one upload batch) are not worth starting workers for
+        if self.workers == 1 or len(batches) == 1:
+            return np.vstack([embed_batch(batch) for batch in batches])
+        if self._executor is None:
+            print(f"🔄 Starting {self.workers} embedding workers...")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return np.vstack(list(self._executor.map(embed_batch, batches)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
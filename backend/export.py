@@ -0,0 +1,230 @@
+"""
+Streaming bulk export of staging and data-warehouse rows.
+
+Rows are read from a psycopg2 server-side (named) cursor in EXPORT_FETCH_SIZE
+batches and every batch is encoded and handed to the response before the next one
+is fetched, so memory stays constant however many rows are exported.
+Formats: csv, ndjson and parquet (parquet needs pyarrow; one row group per batch).
+"""
+import csv
+import io
+import json
+import os
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows fetched from the server-side cursor (and encoded) per batch
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "10000"))
+
+# dataset -> SELECT ... FROM and the columns behind the crop / district / year filters
+EXPORT_DATASETS: Dict[str, Dict] = {
+    "staging": {
+        "select": "SELECT * FROM public.staging_crop_data",
+        "filters": {"crop": '"Crop"', "district": '"district"', "year": '"Year"'},
+    },
+    "warehouse": {
+        # Star schema joined to its dimensions, the columns of vw_crop_yield_enriched. The
+        # tables are joined here because only schema_staging_table_fyp.sql creates that view
+        # (sql/load_data_to_dw.py and the API create just the tables)
+        "select": """SELECT
+            f.fact_id, c.crop_id, c.crop_name, c.variety, c.fertilizer_type, c.recommended_pesticide,
+            l.location_id, l.district, l.soil_type, t.time_id, t.year, t.season,
+            f.area_acres, f.avg_yield_maunds_per_acre, f.avg_yield_kg_per_acre, f.production_kg,
+            f.production_tons, f.avg_price_per_kg, f.total_revenue_pkr, f.expected_revenue,
+            f.climate_score, f.climate_effect_percent
+        FROM climatecrop.fact_crop_yield f
+        JOIN climatecrop.dim_crop c ON f.crop_id = c.crop_id
+        JOIN climatecrop.dim_location l ON f.location_id = l.location_id
+        JOIN climatecrop.dim_time t ON f.time_id = t.time_id""",
+        "filters": {"crop": "c.crop_name", "district": "l.district", "year": "t.year"},
+    },
+}
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(Exception):
+    """Unknown dataset / format, or a format whose library is not installed"""
+
+
+def export_formats() -> List[str]:
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pa is not None]
+
+
+def validate_export(dataset: str, fmt: str):
+    if dataset not in EXPORT_DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}', available: {list(EXPORT_DATASETS)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format '{fmt}', available: {export_formats()}")
+    if fmt not in export_formats():
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+
+def build_export_query(dataset: str, crops: List[str], districts: List[str], years: List[int],
+                       limit: Optional[int] = None) -> Tuple[str, Dict]:
+    """SELECT for a dataset with optional IN-list filters (psycopg2 %(name)s parameters)"""
+    spec = EXPORT_DATASETS[dataset]
+    conditions, params = [], {}
+    for name, values in (("crop", crops), ("district", districts), ("year", years)):
+        if values:
+            conditions.append(f'{spec["filters"][name]} = ANY(%({name})s)')
+            params[name] = list(values)
+    sql = spec["select"]
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if limit:
+        sql += " LIMIT %(limit)s"
+        params["limit"] = limit
+    return sql, params
+
+
+# -----------------------------------
+# Encoders: (column names, batch of row tuples) -> bytes
+# -----------------------------------
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_chunks(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        lines = [
+            json.dumps(dict(zip(columns, (_json_value(value) for value in row))), default=str)
+            for row in batch
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# Postgres type names (cursor.description type codes resolved via pg_type) -> Arrow types
+_ARROW_TYPES = {
+    "int2": "int16", "int4": "int32", "int8": "int64",
+    "float4": "float32", "float8": "float64", "numeric": "float64",
+    "bool": "bool_", "date": "date32",
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that collects what ParquetWriter writes until drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_chunks(columns: List[str], type_names: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    schema = pa.schema([
+        (name, getattr(pa, _ARROW_TYPES.get(type_name, "string"))())
+        for name, type_name in zip(columns, type_names)
+    ])
+    numeric = [_ARROW_TYPES.get(type_name) == "float64" for type_name in type_names]
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [row[i] for row in batch]
+                if numeric[i]:
+                    values = [float(value) if value is not None else None for value in values]
+                elif field.type == pa.string():
+                    values = [str(value) if value is not None else None for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# -----------------------------------
+# Streaming
+# -----------------------------------
+def _type_names(cursor, description) -> List[str]:
+    oids = list({column.type_code for column in description})
+    cursor.execute("SELECT oid, typname FROM pg_type WHERE oid = ANY(%s)", (oids,))
+    names = dict(cursor.fetchall())
+    return [names.get(column.type_code, "text") for column in description]
+
+
+def stream_export(engine, dataset: str, fmt: str, crops: List[str], districts: List[str],
+                  years: List[int], limit: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Generator of encoded chunks. Holds one pooled connection in a read-only
+    transaction for the duration of the export and releases it when the generator
+    finishes or is closed (e.g. the client disconnected).
+    """
+    sql, params = build_export_query(dataset, crops, districts, years, limit)
+    connection = engine.raw_connection()
+    try:
+        helper = connection.cursor()
+        helper.execute("SET TRANSACTION READ ONLY")
+        cursor = connection.cursor(name=f"export_{uuid.uuid4().hex[:12]}")
+        cursor.itersize = EXPORT_FETCH_SIZE
+        cursor.execute(sql, params)
+
+        # A named cursor only has a description after the first fetch
+        first = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        columns = [column.name for column in cursor.description]
+
+        def batches():
+            batch, total = first, 0
+            while batch:
+                total += len(batch)
+                yield batch
+                batch = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            print(f"✅ Exported {total} {dataset} rows as {fmt}")
+
+        if fmt == "csv":
+            yield from _csv_chunks(columns, batches())
+        elif fmt == "ndjson":
+            yield from _ndjson_chunks(columns, batches())
+        else:
+            yield from _parquet_chunks(columns, _type_names(helper, cursor.description), batches())
+        cursor.close()
+        helper.close()
+    except Exception as e:
+        print(f"❌ Export of {dataset} as {fmt} failed: {e}")
+        raise
+    finally:
+        try:
+            connection.rollback()
+        finally:
+            connection.close()
@@ -0,0 +1,117 @@
+"""
+Opt-in response formats for the read endpoints.
+
+- json:     default row-per-object JSON (FastAPI's encoder, unchanged)
+- columnar: one array per column, serialized with orjson when installed
+- msgpack:  the columnar layout as MessagePack
+
+Clients choose with ?format=columnar|msgpack or an Accept header. Row lists are
+transposed once per data version; the rendered bytes are cached by the caller.
+"""
+import json
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.climacrop.columnar+json"
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": COLUMNAR_MEDIA_TYPE,
+    "msgpack": "application/msgpack",
+}
+
+# Accept header media types -> format
+ACCEPTED_MEDIA_TYPES = {
+    "application/json": "json",
+    COLUMNAR_MEDIA_TYPE: "columnar",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+}
+
+
+class UnsupportedFormat(Exception):
+    """Requested format is unknown or its encoder is not installed"""
+
+
+def available_formats() -> List[str]:
+    formats = ["json", "columnar"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+
+def negotiate_format(format_param: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick the response format: an explicit ?format= wins, then the first
+    supported media type in Accept (q=0 entries are skipped), else json
+    """
+    if format_param:
+        fmt = format_param.lower()
+        if fmt not in available_formats():
+            raise UnsupportedFormat(f"Unsupported format '{format_param}', available: {available_formats()}")
+        return fmt
+
+    for part in (accept or "").split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if any(param.replace(" ", "") in ("q=0", "q=0.0") for param in params):
+            continue
+        fmt = ACCEPTED_MEDIA_TYPES.get(media_type.lower())
+        if fmt in available_formats():
+            return fmt
+    return "json"
+
+
+def _columns(rows: List[Dict]) -> Dict[str, List]:
+    """[{col: value}, ...] -> {col: [values...]}"""
+    if not rows:
+        return {}
+    names = list(rows[0].keys())
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def to_columnar(body: Any) -> Any:
+    """Transpose every "data" row list (including those nested in batch "results")"""
+    if isinstance(body, dict):
+        converted = {}
+        for key, value in body.items():
+            if key == "data" and isinstance(value, list) and all(isinstance(row, dict) for row in value):
+                converted[key] = _columns(value)
+            else:
+                converted[key] = to_columnar(value)
+        return converted
+    if isinstance(body, list):
+        return [to_columnar(item) for item in body]
+    return body
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def render(body: Any, fmt: str) -> Tuple[bytes, str]:
+    """Serialize a response body in a non-default format -> (bytes, media type)"""
+    columnar = to_columnar(body)
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack is not installed")
+        return msgpack.packb(columnar, default=_default, use_bin_type=True), MEDIA_TYPES[fmt]
+    if fmt == "columnar":
+        if orjson is not None:
+            return orjson.dumps(columnar, default=_default), MEDIA_TYPES[fmt]
+        return json.dumps(columnar, default=_default, separators=(",", ":")).encode(), MEDIA_TYPES[fmt]
+    raise UnsupportedFormat(f"Unsupported format '{fmt}'")
@@ -0,0 +1,277 @@
+"""
+Index management for the staging and star-schema tables.
+
+Each API query shape (see queries.py) has one declared index. Indexes are created
+after bulk loads and check_query_plans() runs EXPLAIN on every endpoint query to
+make sure none of them falls back to a sequential scan.
+
+Usage: python indexes.py   (exits with status 1 if any endpoint query seq-scans)
+"""
+import json
+import os
+import sys
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from queries import (
+    CROPS_QUERY, MAIN_CROPS_QUERY, REVENUE_PREDICTION_QUERY, REVENUE_PREDICTION_BATCH_QUERY,
+    CROP_STATISTICS_QUERY, FERTILIZER_PEST_CONTROL_QUERY,
+    fertilizer_pest_control_query, revenue_prediction_query
+)
+
+# -----------------------------------
+# Declared indexes (one per query shape)
+# -----------------------------------
+INDEX_DEFINITIONS: List[Dict] = [
+    {
+        "name": "idx_staging_crop",
+        "table": "public.staging_crop_data",
+        "definition": '("Crop")',
+        "serves": "/crops (distinct crop list and per-crop counts)",
+    },
+    {
+        "name": "idx_staging_revenue_keyset",
+        "table": "public.staging_crop_data",
+        "definition": '("Crop", "Temperature_Category", "expected_revenue" DESC, "staging_row_id" DESC)',
+        "serves": "/revenue-prediction pages and /revenue-prediction/batch (filter crop + temperature, order by expected_revenue)",
+    },
+    {
+        "name": "idx_staging_climate_keyset",
+        "table": "public.staging_crop_data",
+        "definition": '("Crop", "Temperature_Category", "climate_score" DESC, "expected_revenue" DESC, "staging_row_id" DESC)',
+        "serves": "/fertilizer-pest-control pages (filter crop + temperature, order by climate_score)",
+    },
+    {
+        "name": "idx_staging_crop_temp_stats",
+        "table": "public.staging_crop_data",
+        "definition": '("Crop", "Temperature_Category") '
+                      'INCLUDE ("expected_revenue", "Total_Revenue_PKR", "Avg_Yield_kg_per_acre", "climate_score")',
+        "serves": "crop_statistics rollup rebuild (covering index, aggregates by index-only scan)",
+    },
+    {
+        "name": "idx_crop_statistics_crop",
+        "table": "climatecrop.crop_statistics",
+        "definition": "(crop_name, temp_category)",
+        "serves": "/crop-statistics (point lookup on the rollup)",
+    },
+    {
+        "name": "idx_staging_load_batch",
+        "table": "public.staging_crop_data",
+        "definition": '("load_batch_id")',
+        "serves": "refresh_dw incremental mode (rows of one load batch)",
+    },
+    {
+        "name": "idx_fact_crop_id",
+        "table": "climatecrop.fact_crop_yield",
+        "definition": "(crop_id)",
+        "serves": "fact -> dim_crop joins (/export/warehouse, vw_crop_yield_enriched, analytics)",
+    },
+    {
+        "name": "idx_fact_location_id",
+        "table": "climatecrop.fact_crop_yield",
+        "definition": "(location_id)",
+        "serves": "fact -> dim_location joins",
+    },
+    {
+        "name": "idx_fact_time_id",
+        "table": "climatecrop.fact_crop_yield",
+        "definition": "(time_id)",
+        "serves": "fact -> dim_time joins",
+    },
+    {
+        "name": "idx_dim_crop_key",
+        "table": "climatecrop.dim_crop",
+        "definition": "(crop_name, COALESCE(variety, ''))",
+        "unique": True,
+        "serves": "refresh_dw dimension lookups; one member per key (ON CONFLICT DO NOTHING)",
+    },
+    {
+        "name": "idx_dim_location_key",
+        "table": "climatecrop.dim_location",
+        "definition": "(district, COALESCE(soil_type, ''))",
+        "unique": True,
+        "serves": "refresh_dw dimension lookups; one member per key (ON CONFLICT DO NOTHING)",
+    },
+    {
+        "name": "idx_dim_time_key",
+        "table": "climatecrop.dim_time",
+        "definition": "(year, COALESCE(season, ''))",
+        "unique": True,
+        "serves": "refresh_dw dimension lookups; one member per key (ON CONFLICT DO NOTHING)",
+    },
+]
+
+# Superseded by the keyset indexes above; dropped by ensure_indexes()
+RETIRED_INDEXES = ["idx_staging_crop_temp_revenue", "idx_staging_crop_temp_climate"]
+
+# Staging query indexes are dropped before a full reload and rebuilt afterwards
+STAGING_QUERY_INDEXES = [idx["name"] for idx in INDEX_DEFINITIONS if idx["table"] == "public.staging_crop_data"]
+
+ANALYZED_TABLES = ["public.staging_crop_data", "climatecrop.fact_crop_yield"]
+# An upload refreshes planner statistics itself only when it adds at least this fraction
+# of the staging table; smaller batches are left to autovacuum's auto-analyze
+ANALYZE_BATCH_FRACTION = float(os.getenv("ANALYZE_BATCH_FRACTION", "0.1"))
+
+
+def index_ddl(index: Dict) -> str:
+    unique = "UNIQUE " if index.get("unique") else ""
+    return f'CREATE {unique}INDEX IF NOT EXISTS {index["name"]} ON {index["table"]} {index["definition"]}'
+
+
+def _create_unique_index(conn, index: Dict, replace: bool) -> bool:
+    """
+    Build a unique index in a savepoint, replacing a non-unique one of the same name.
+    Existing duplicate keys make the build fail; the upload goes on with the old index
+    and the next full rebuild (which truncates the dimensions) gets it created.
+    """
+    schema = index["table"].split(".")[0]
+    savepoint = conn.begin_nested()
+    try:
+        if replace:
+            conn.execute(text(f'DROP INDEX IF EXISTS {schema}.{index["name"]}'))
+        conn.execute(text(index_ddl(index)))
+    except Exception as e:
+        savepoint.rollback()
+        print(f"⚠️ Could not create unique index {index['name']} (duplicate keys in {index['table']}?): {e}")
+        return False
+    savepoint.commit()
+    return True
+
+
+def drop_staging_indexes(conn):
+    """Drop the staging query indexes (call before a full bulk load)"""
+    for name in STAGING_QUERY_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS public.{name}"))
+
+
+def batch_needs_analyze(conn, rows_loaded: int) -> bool:
+    """True when a load of `rows_loaded` rows is a significant part of the staging table"""
+    estimate = conn.execute(text(
+        "SELECT reltuples FROM pg_class WHERE oid = 'public.staging_crop_data'::regclass"
+    )).scalar()
+    # -1 / 0: never analyzed (or empty), so there are no statistics worth keeping
+    if not estimate or estimate <= 0:
+        return True
+    return rows_loaded >= estimate * ANALYZE_BATCH_FRACTION
+
+
+def ensure_indexes(conn, analyze: bool = False) -> List[str]:
+    """
+    Create any declared index that does not exist yet and drop retired ones; with
+    `analyze`, also refresh planner statistics (a full table scan: only after full
+    rebuilds or large batches, see batch_needs_analyze). Runs inside the caller's
+    transaction. Returns the names of the indexes created.
+    """
+    existing = dict(conn.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname IN ('public', 'climatecrop')"
+    )).fetchall())
+    for name in RETIRED_INDEXES:
+        if name in existing:
+            conn.execute(text(f"DROP INDEX IF EXISTS public.{name}"))
+    created = []
+    for index in INDEX_DEFINITIONS:
+        definition = existing.get(index["name"])
+        if index.get("unique"):
+            # Also upgrades the non-unique indexes of databases created before the constraint
+            if definition is None or not definition.startswith("CREATE UNIQUE"):
+                if _create_unique_index(conn, index, replace=definition is not None):
+                    created.append(index["name"])
+        elif definition is None:
+            conn.execute(text(index_ddl(index)))
+            created.append(index["name"])
+    if analyze:
+        for table in ANALYZED_TABLES:
+            conn.execute(text(f"ANALYZE {table}"))
+    if created:
+        print(f"✅ Created indexes: {', '.join(created)}")
+    return created
+
+
+# -----------------------------------
+# Query-plan check
+# -----------------------------------
+ENDPOINT_QUERIES = [
+    ("/crops", CROPS_QUERY),
+    ("/crops (main crops)", MAIN_CROPS_QUERY),
+    ("/revenue-prediction", REVENUE_PREDICTION_QUERY),
+    ("/revenue-prediction (next page)", revenue_prediction_query([0, 0])[0]),
+    ("/revenue-prediction/batch", REVENUE_PREDICTION_BATCH_QUERY),
+    ("/crop-statistics", CROP_STATISTICS_QUERY),
+    ("/fertilizer-pest-control", FERTILIZER_PEST_CONTROL_QUERY),
+    ("/fertilizer-pest-control (next page)", fertilizer_pest_control_query([0, 0, 0])[0]),
+]
+
+
+def _plan_nodes(plan: Dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _sample_params(conn) -> Dict:
+    row = conn.execute(text("""
+        SELECT "Crop", "Temperature_Category"
+        FROM public.staging_crop_data
+        WHERE "Crop" IS NOT NULL AND "Temperature_Category" IS NOT NULL
+        LIMIT 1
+    """)).first()
+    crop, temp = (row[0], row[1]) if row else ("Rice", "Best")
+    return {
+        "crop_name": crop,
+        "temp_category": temp,
+        "crop_names": [crop, crop],
+        "temp_categories": [temp, "Average"],
+        "row_limit": 50,
+        # Cursor values for the next-page queries
+        "after_0": 0,
+        "after_1": 0,
+        "after_2": 0,
+    }
+
+
+def check_query_plans(conn) -> Dict:
+    """
+    EXPLAIN every endpoint query with sequential scans disabled. If a query still
+    plans a Seq Scan, no usable index exists for its shape and the check fails.
+    Returns {"ok": bool, "queries": [...]} with the indexes each plan uses.
+    """
+    report = []
+    trans = conn.begin_nested() if conn.in_transaction() else conn.begin()
+    try:
+        params = _sample_params(conn)
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for endpoint, query in ENDPOINT_QUERIES:
+            explain = text(f"EXPLAIN (FORMAT JSON) {query.text}")
+            plan_json = conn.execute(explain, params).scalar()
+            if isinstance(plan_json, str):
+                plan_json = json.loads(plan_json)
+            nodes = list(_plan_nodes(plan_json[0]["Plan"]))
+            seq_scans = sorted({node.get("Relation Name") for node in nodes if node["Node Type"] == "Seq Scan"})
+            indexes = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+            report.append({
+                "endpoint": endpoint,
+                "ok": not seq_scans,
+                "indexes_used": indexes,
+                "seq_scans": seq_scans,
+                "total_cost": plan_json[0]["Plan"].get("Total Cost"),
+            })
+    finally:
+        trans.rollback()
+    return {"ok": all(item["ok"] for item in report), "params": params, "queries": report}
+
+
+if __name__ == "__main__":
+    from main import engine
+
+    if engine is None:
+        print("❌ Database connection not available")
+        sys.exit(1)
+
+    with engine.connect() as conn:
+        result = check_query_plans(conn)
+
+    for item in result["queries"]:
+        status = "✅" if item["ok"] else "❌ SEQ SCAN"
+        print(f"{status} {item['endpoint']}: indexes={item['indexes_used']} seq_scans={item['seq_scans']}")
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,193 @@
+"""
+Background job runner for long-running ETL pipeline loads
+Jobs run on a small thread pool, report progress and can be cancelled
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Pipeline jobs running at the same time (others wait in the queue)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+# Finished jobs kept for the status endpoint
+PIPELINE_JOB_HISTORY = int(os.getenv("PIPELINE_JOB_HISTORY", "50"))
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class PipelineJob:
+    """State and progress of one pipeline run"""
+
+    def __init__(self, params: Optional[Dict] = None):
+        self.id = str(uuid.uuid4())
+        self.params = params or {}
+        self.status = "queued"  # queued, running, succeeded, failed, cancelled
+        self.phase = "queued"
+        self.rows_parsed = 0
+        self.rows_loaded = 0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_monotonic: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._cancel_hooks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    # Progress reporting (called from the worker thread)
+    def set_phase(self, phase: str):
+        self.check_cancelled()
+        with self._lock:
+            self.phase = phase
+        print(f"🔄 Job {self.id[:8]}: {phase}")
+
+    def set_rows_parsed(self, count: int):
+        with self._lock:
+            self.rows_parsed = count
+        self.check_cancelled()
+
+    def set_rows_loaded(self, count: int):
+        with self._lock:
+            self.rows_loaded = count
+        self.check_cancelled()
+
+    # Cancellation
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def add_cancel_hook(self, hook: Callable[[], None]):
+        """Register a callback that interrupts blocking work (e.g. cancels a running query)"""
+        with self._lock:
+            self._cancel_hooks.append(hook)
+
+    def remove_cancel_hook(self, hook: Callable[[], None]):
+        with self._lock:
+            if hook in self._cancel_hooks:
+                self._cancel_hooks.remove(hook)
+
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job already finished"""
+        with self._lock:
+            if self.status in ("succeeded", "failed", "cancelled"):
+                return False
+            self._cancel_event.set()
+            hooks = list(self._cancel_hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"⚠️ Cancel hook failed for job {self.id[:8]}: {e}")
+        return True
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            if self._started_monotonic is None:
+                elapsed = 0.0
+            else:
+                end = self._finished_monotonic or time.monotonic()
+                elapsed = end - self._started_monotonic
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "phase": self.phase,
+                "params": self.params,
+                "rows_parsed": self.rows_parsed,
+                "rows_loaded": self.rows_loaded,
+                "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(self.rows_loaded / elapsed, 1) if elapsed > 0 else 0.0,
+                "cancel_requested": self._cancel_event.is_set(),
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "error": self.error,
+                "result": self.result,
+            }
+
+
+class JobRunner:
+    """Runs pipeline jobs on a bounded thread pool and keeps recent job history"""
+
+    def __init__(self, max_workers: int = PIPELINE_WORKERS, history: int = PIPELINE_JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._jobs: "OrderedDict[str, PipelineJob]" = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Dict], params: Optional[Dict] = None) -> PipelineJob:
+        """
+        Queue `fn(job=job, **params)`; fn returns a result dict with a "success" flag
+        """
+        job = PipelineJob(params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: PipelineJob, fn: Callable[..., Dict]):
+        with job._lock:
+            if job.cancel_requested:
+                job.status = job.phase = "cancelled"
+                job.finished_at = datetime.now()
+                return
+            job.status = "running"
+            job.started_at = datetime.now()
+            job._started_monotonic = time.monotonic()
+
+        try:
+            result = fn(job=job, **job.params)
+            error = None if result.get("success") else result.get("error")
+        except JobCancelled:
+            result, error = None, None
+        except Exception as e:
+            result, error = None, str(e)
+
+        with job._lock:
+            job.result = result
+            job.error = error
+            if result and result.get("success"):
+                job.status = "succeeded"
+            elif job.cancel_requested:
+                job.status = "cancelled"
+                job.error = None
+            else:
+                job.status = "failed"
+            job.phase = job.status
+            job.finished_at = datetime.now()
+            job._finished_monotonic = time.monotonic()
+        print(f"✅ Job {job.id[:8]} finished: {job.status}")
+
+    def _trim(self):
+        """Drop the oldest finished jobs beyond the history limit"""
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.status in ("succeeded", "failed", "cancelled")]
+        for job_id in finished[:max(0, len(self._jobs) - self._history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[PipelineJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[PipelineJob]:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[bool]:
+        """Returns None for unknown jobs, otherwise whether cancellation was requested"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return job.cancel()
@@ -0,0 +1,240 @@
+"""
+Async LLM client layer for the chatbot.
+
+LLMClient is the pluggable interface; GeminiClient calls Gemini's native async API
+(no executor thread per request). LimitedLLMClient wraps any client with
+- a concurrency cap (semaphore) on in-flight LLM calls,
+- a bounded wait queue: when it is full, or a request waited LLM_QUEUE_TIMEOUT
+  seconds for a slot, the call fails fast with Overloaded (503 + Retry-After),
+- per-client token buckets: a client over its rate gets Overloaded (429 + Retry-After).
+so a burst sheds load quickly instead of every request running into REQUEST_TIMEOUT.
+A streamed answer holds its slot until the stream is finished or closed.
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+import threading
+import time
+from typing import AsyncIterator, Dict, Optional
+
+from cache import LRUCache
+from concurrency import Overloaded
+
+# LLM calls in flight at once, and how many more may wait for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+# Longest wait for a slot before the request is shed (seconds)
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Per-client token bucket: sustained LLM calls per minute and burst size (0 disables)
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "20"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "5"))
+# Clients whose buckets are remembered (least recently seen are forgotten first)
+LLM_RATE_CLIENTS = int(os.getenv("LLM_RATE_CLIENTS", "10000"))
+
+
+class LLMClient(ABC):
+    """Interface: an async text generator"""
+
+    name = "llm"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        """The complete answer to `prompt`"""
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Text pieces as they are generated (clients without streaming yield one piece)"""
+        yield await self.generate(prompt)
+
+
+class GeminiClient(LLMClient):
+    """google-generativeai GenerativeModel called through its native async API"""
+
+    name = "gemini"
+
+    def __init__(self, model):
+        self.model = model
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        if response and response.text:
+            return response.text.strip()
+        return ""
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. only the finish reason)
+                continue
+            if text:
+                yield text
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `capacity`; take() returns 0 or the seconds until a token is free"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class LimitedLLMClient(LLMClient):
+    """Concurrency limit, bounded queue and per-client rate limits around another client"""
+
+    def __init__(self, client: LLMClient, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_queue: int = LLM_MAX_QUEUE, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 rate_per_minute: float = LLM_RATE_PER_MINUTE, burst: int = LLM_RATE_BURST):
+        self.client = client
+        self.name = client.name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._buckets = LRUCache(LLM_RATE_CLIENTS)
+        self._buckets_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.pending = 0  # waiting + in flight
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.total_wait_seconds = 0.0
+        self.total_call_seconds = 0.0
+        self.streams = 0
+        self.first_tokens = 0
+        self.total_first_token_seconds = 0.0
+
+    def _check_rate(self, client_id: Optional[str]):
+        if not client_id or self.rate <= 0:
+            return
+        with self._buckets_lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets.set(client_id, bucket)
+        retry_after = bucket.take()
+        if retry_after:
+            self.rate_limited += 1
+            raise Overloaded("Too many chat requests, please slow down", retry_after, status_code=429)
+
+    @asynccontextmanager
+    async def _slot(self, client_id: Optional[str]):
+        """Rate check, then a concurrency slot held for the body of the `async with`"""
+        self._check_rate(client_id)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Admission is counted before the first await, so a simultaneous burst is capped too
+        if self.pending >= self.max_concurrency + self.max_queue:
+            self.shed_queue_full += 1
+            raise Overloaded(f"The assistant is busy ({self.waiting} requests waiting), please try again shortly",
+                             self.queue_timeout / 2 or 1)
+        self.pending += 1
+        try:
+            await self._acquire()
+            try:
+                yield
+            finally:
+                self._semaphore.release()
+        finally:
+            self.pending -= 1
+
+    async def generate(self, prompt: str, client_id: Optional[str] = None) -> str:
+        async with self._slot(client_id):
+            return await self._call(prompt)
+
+    async def stream(self, prompt: str, client_id: Optional[str] = None) -> AsyncIterator[str]:
+        async with self._slot(client_id):
+            self.in_flight += 1
+            started = time.perf_counter()
+            first = True
+            try:
+                async for text in self.client.stream(prompt):
+                    if first:
+                        self.total_first_token_seconds += time.perf_counter() - started
+                        self.first_tokens += 1
+                        first = False
+                    yield text
+            except BaseException:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.total_call_seconds += time.perf_counter() - started
+            self.completed += 1
+            self.streams += 1
+
+    async def _acquire(self):
+        if not self._semaphore.locked():
+            # A free slot: no wait to count
+            await self._semaphore.acquire()
+            return
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_queue_timeout += 1
+            raise Overloaded("The assistant is busy, please try again shortly", self.queue_timeout / 2 or 1)
+        finally:
+            self.waiting -= 1
+            self.total_wait_seconds += time.perf_counter() - started
+
+    async def _call(self, prompt: str) -> str:
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await self.client.generate(prompt)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_call_seconds += time.perf_counter() - started
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict:
+        calls = self.completed + self.failed
+        admitted = calls + self.in_flight
+        return {
+            "client": self.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_timeout": self.shed_queue_timeout,
+            "avg_queue_wait_ms": round(self.total_wait_seconds * 1000 / admitted, 3) if admitted else 0.0,
+            "avg_call_ms": round(self.total_call_seconds * 1000 / calls, 3) if calls else 0.0,
+            "streams": self.streams,
+            "avg_first_token_ms": round(self.total_first_token_seconds * 1000 / self.first_tokens, 3) if self.first_tokens else 0.0,
+        }
@@ -0,0 +1,254 @@
+"""
+SQL for the read endpoints, kept in one place so the API handlers and the
+index / query-plan checks (indexes.py) always use the same query shapes
+"""
+import base64
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+# -----------------------------------
+# Keyset pagination
+# -----------------------------------
+# Paged queries order by their sort keys DESC (NULLS FIRST, Postgres' default for DESC)
+# and end with the unique staging row id. The last row's (sort keys, row id) is the
+# continuation token; the next page starts strictly after it, so every page is one
+# index range scan no matter how deep the client pages.
+
+# Column type of each cursor field. A token is client input: a float or out-of-range
+# integer for a BIGINT would only fail inside asyncpg, so decode_cursor checks the types.
+CURSOR_FIELD_TYPES = {"expected_revenue": "BIGINT", "climate_score": "FLOAT", "row_id": "BIGINT"}
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def keyset_predicate(columns: List[str], after: List) -> Tuple[str, Dict]:
+    """
+    WHERE fragment selecting rows that sort after `after` in ORDER BY columns... DESC.
+    The last column must be NOT NULL (the row id). Returns (sql, bind params).
+    """
+    params = {f"after_{i}": value for i, value in enumerate(after) if value is not None}
+
+    def after_from(i: int) -> str:
+        column, param = columns[i], f":after_{i}"
+        if i == len(columns) - 1:
+            return f"{column} < {param}"
+        if after[i] is None:
+            # NULLs sort first: stay in the NULL group on a tie, or move on to any value
+            return f"(({column} IS NULL AND {after_from(i + 1)}) OR {column} IS NOT NULL)"
+        return f"({column} < {param} OR ({column} = {param} AND {after_from(i + 1)}))"
+
+    sql = f"AND {after_from(0)}"
+    if after[0] is not None:
+        # Redundant bound on the leading key so the index scan starts at the cursor
+        sql += f" AND {columns[0]} <= :after_0"
+    return sql, params
+
+
+def encode_cursor(scope: List, values: List) -> str:
+    """Opaque continuation token for the row values of the last row on a page"""
+    payload = json.dumps({"s": scope, "v": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _cursor_value(value, pg_type: str):
+    """A cursor value as a bind parameter for a column of pg_type; ValueError if it cannot be one"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("Malformed cursor")
+    if pg_type == "BIGINT":
+        if not isinstance(value, int) or not BIGINT_MIN <= value <= BIGINT_MAX:
+            raise ValueError("Malformed cursor")
+        return value
+    try:
+        value = float(value)
+    except OverflowError:
+        raise ValueError("Malformed cursor")
+    if not math.isfinite(value):
+        raise ValueError("Malformed cursor")
+    return value
+
+
+def decode_cursor(token: str, scope: List, fields: List[str]) -> List:
+    """
+    Values of a token made by encode_cursor for the same scope and cursor fields, checked
+    against the fields' column types; ValueError if invalid
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        values = payload["v"]
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if payload.get("s") != scope or not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError("Cursor does not belong to this query")
+    if values[-1] is None:
+        raise ValueError("Malformed cursor")
+    return [None if value is None else _cursor_value(value, CURSOR_FIELD_TYPES[field])
+            for field, value in zip(fields, values)]
+
+
+# Data watermark: table count, table oids and write counters of staging and the
+# climatecrop warehouse. Any write moves it, whichever process made it, and dropping /
+# recreating the tables (sql/load_data_to_dw.py) changes the oids.
+DATA_WATERMARK_QUERY = text("""
+    SELECT count(*) AS tables,
+           coalesce(sum(relid::bigint), 0)::bigint AS relids,
+           coalesce(sum(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint AS changes,
+           (SELECT extract(epoch FROM max(loaded_at))::float8 FROM public.staging_load_batches) AS last_load
+    FROM pg_stat_user_tables
+    WHERE (schemaname = 'public' AND relname = 'staging_crop_data')
+       OR schemaname = 'climatecrop'
+""")
+
+# /crops - all crop names
+CROPS_QUERY = text("""
+    SELECT DISTINCT "Crop" as crop_name
+    FROM public.staging_crop_data
+    WHERE "Crop" IS NOT NULL
+    ORDER BY "Crop"
+""")
+
+# /crops - main crops (most common ones)
+MAIN_CROPS_QUERY = text("""
+    SELECT "Crop" as crop_name, COUNT(*) as count
+    FROM public.staging_crop_data
+    WHERE "Crop" IS NOT NULL
+    GROUP BY "Crop"
+    ORDER BY count DESC
+    LIMIT 5
+""")
+
+# /revenue-prediction
+_REVENUE_PREDICTION_COLUMNS = """
+        s."Variety" as variety,
+        s."Crop" as crop_name,
+        s."district" as district,
+        s."Season" as season,
+        s."Soil_Type" as soil_type,
+        s."Temperature_Category" as temp_category,
+        s."Decision_Tree_Predicted_Revenue" as decision_tree_revenue,
+        s."XGBoost_Predicted_Revenue" as xgboost_revenue,
+        s."Random_Forest_Predicted_Revenue" as random_forest_revenue,
+        s."XGBoost_Tuned_Predicted_Revenue" as xgboost_tuned_revenue,
+        s."expected_revenue" as expected_revenue,
+        s."Total_Revenue_PKR" as total_revenue_pkr,
+        s."Avg_Yield_kg_per_acre" as avg_yield_kg_per_acre,
+        s."Avg_Price_per_kg" as avg_price_per_kg,
+        s."Avg_Price_PKR" as avg_price_pkr,
+        s."climate_score" as climate_score,
+        s."climate_effect_percent" as climate_effect_percent,
+        s."climate_risk_level" as climate_risk_level,
+        s."rainfall" as rainfall,
+        s."humidity" as humidity,
+        s."temperature" as temperature,
+        s."Year" as year
+"""
+
+REVENUE_PREDICTION_SORT = ['s."expected_revenue"', 's."staging_row_id"']
+# Result fields holding the sort keys (cursor values)
+REVENUE_PREDICTION_CURSOR_FIELDS = ["expected_revenue", "row_id"]
+
+_REVENUE_PREDICTION_PAGE = """
+    SELECT""" + _REVENUE_PREDICTION_COLUMNS + """,
+        s."staging_row_id" as row_id
+    FROM public.staging_crop_data s
+    WHERE s."Crop" = :crop_name
+        AND s."Temperature_Category" = :temp_category
+        {keyset}
+    ORDER BY s."expected_revenue" DESC, s."staging_row_id" DESC
+    LIMIT :row_limit
+"""
+
+
+def revenue_prediction_query(after: Optional[List] = None):
+    """One page of /revenue-prediction: first page, or the rows after a cursor's values"""
+    if after is None:
+        return REVENUE_PREDICTION_QUERY, {}
+    predicate, params = keyset_predicate(REVENUE_PREDICTION_SORT, after)
+    return text(_REVENUE_PREDICTION_PAGE.replace("{keyset}", predicate)), params
+
+
+REVENUE_PREDICTION_QUERY = text(_REVENUE_PREDICTION_PAGE.replace("{keyset}", ""))
+
+# /revenue-prediction/batch - top :row_limit rows for every (crop, temperature) pair in
+# one round-trip; the LATERAL subquery is the single-key query, so each pair is an
+# index scan on idx_staging_revenue_keyset. The outer sort repeats the single-key order
+# (DESC is NULLS FIRST there too): a Sort node does not keep the subquery's row order.
+REVENUE_PREDICTION_BATCH_QUERY = text(f"""
+    SELECT k.key_index, p.*
+    FROM unnest(CAST(:crop_names AS TEXT[]), CAST(:temp_categories AS TEXT[]))
+        WITH ORDINALITY AS k(crop_name, temp_category, key_index)
+    CROSS JOIN LATERAL (
+        SELECT{_REVENUE_PREDICTION_COLUMNS},
+            s."staging_row_id" as row_id
+        FROM public.staging_crop_data s
+        WHERE s."Crop" = k.crop_name
+            AND s."Temperature_Category" = k.temp_category
+        ORDER BY s."expected_revenue" DESC, s."staging_row_id" DESC
+        LIMIT :row_limit
+    ) p
+    ORDER BY k.key_index, p.expected_revenue DESC NULLS FIRST, p.row_id DESC
+""")
+
+# /crop-statistics - point lookup on the rollup maintained by refresh_dw (see rollups.py)
+CROP_STATISTICS_QUERY = text("""
+    SELECT
+        r.temp_category,
+        r.record_count,
+        r.avg_expected_revenue,
+        r.avg_total_revenue,
+        r.avg_yield_kg_per_acre,
+        r.avg_climate_score
+    FROM climatecrop.crop_statistics r
+    WHERE r.crop_name = :crop_name
+    ORDER BY r.temp_category
+""")
+
+# /fertilizer-pest-control
+FERTILIZER_PEST_CONTROL_SORT = ['s."climate_score"', 's."expected_revenue"', 's."staging_row_id"']
+FERTILIZER_PEST_CONTROL_CURSOR_FIELDS = ["climate_score", "expected_revenue", "row_id"]
+
+_FERTILIZER_PEST_CONTROL_PAGE = """
+    SELECT
+        s."Variety" as variety,
+        s."Crop" as crop_name,
+        s."Fertilizer_Type" as fertilizer_type,
+        s."N" as nitrogen,
+        s."P" as phosphorus,
+        s."K" as potassium,
+        s."ph" as ph_level,
+        s."Recommended_Pesticide" as recommended_pesticide,
+        s."Expected_Disease" as expected_disease,
+        s."district" as district,
+        s."Season" as season,
+        s."Soil_Type" as soil_type,
+        s."Temperature_Category" as temp_category,
+        s."climate_score" as climate_score,
+        s."climate_effect_percent" as climate_effect_percent,
+        s."climate_risk_level" as climate_risk_level,
+        s."rainfall" as rainfall,
+        s."humidity" as humidity,
+        s."temperature" as temperature,
+        s."temperature_norm" as temperature_norm,
+        s."rainfall_norm" as rainfall_norm,
+        s."Year" as year,
+        s."expected_revenue" as expected_revenue,
+        s."staging_row_id" as row_id
+    FROM public.staging_crop_data s
+    WHERE s."Crop" = :crop_name
+        AND s."Temperature_Category" = :temp_category
+        {keyset}
+    ORDER BY s."climate_score" DESC, s."expected_revenue" DESC, s."staging_row_id" DESC
+    LIMIT :row_limit
+"""
+
+
+def fertilizer_pest_control_query(after: Optional[List] = None):
+    """One page of /fertilizer-pest-control: first page, or the rows after a cursor's values"""
+    if after is None:
+        return FERTILIZER_PEST_CONTROL_QUERY, {}
+    predicate, params = keyset_predicate(FERTILIZER_PEST_CONTROL_SORT, after)
+    return text(_FERTILIZER_PEST_CONTROL_PAGE.replace("{keyset}", predicate)), params
+
+
+FERTILIZER_PEST_CONTROL_QUERY = text(_FERTILIZER_PEST_CONTROL_PAGE.replace("{keyset}", ""))
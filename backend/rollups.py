@@ -0,0 +1,90 @@
+"""
+Precomputed rollups maintained together with the data warehouse.
+
+climatecrop.crop_statistics holds crop x temperature-category statistics so
+/crop-statistics is a point lookup instead of a GROUP BY over staging rows.
+"""
+from typing import Optional
+
+from sqlalchemy import text
+
+from staging import BATCH_COLUMN
+
+CROP_STATISTICS_DDL = """
+    CREATE TABLE IF NOT EXISTS climatecrop.crop_statistics (
+        crop_name TEXT NOT NULL,
+        temp_category TEXT,
+        record_count BIGINT NOT NULL,
+        avg_expected_revenue NUMERIC,
+        avg_total_revenue NUMERIC,
+        avg_yield_kg_per_acre FLOAT,
+        avg_climate_score FLOAT,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+# Aggregates rows of staging; {crop_filter} narrows it to the crops being refreshed
+_CROP_STATISTICS_INSERT = """
+    INSERT INTO climatecrop.crop_statistics(
+        crop_name, temp_category, record_count,
+        avg_expected_revenue, avg_total_revenue, avg_yield_kg_per_acre, avg_climate_score
+    )
+    SELECT
+        s."Crop",
+        s."Temperature_Category",
+        COUNT(*),
+        AVG(s."expected_revenue"),
+        AVG(s."Total_Revenue_PKR"),
+        AVG(s."Avg_Yield_kg_per_acre"),
+        AVG(s."climate_score")
+    FROM public.staging_crop_data s
+    WHERE s."Crop" IS NOT NULL
+        {crop_filter}
+    GROUP BY s."Crop", s."Temperature_Category"
+"""
+
+# Full rebuild (plain SQL so sql/load_data_to_dw.py can run it through a psycopg2 cursor)
+CROP_STATISTICS_FULL_REFRESH = [
+    CROP_STATISTICS_DDL,
+    "TRUNCATE TABLE climatecrop.crop_statistics",
+    _CROP_STATISTICS_INSERT.format(crop_filter=""),
+]
+
+_BATCH_CROPS = f"""
+    SELECT DISTINCT b."Crop"
+    FROM public.staging_crop_data b
+    WHERE b."{BATCH_COLUMN}" = :batch_id AND b."Crop" IS NOT NULL
+"""
+
+
+def refresh_crop_statistics(conn, batch_id: Optional[int] = None):
+    """
+    Rebuild climatecrop.crop_statistics inside the caller's transaction.
+    With a batch id only the crops present in that load batch are recomputed.
+    Incremental refreshes of concurrent uploads run one at a time: SHARE ROW EXCLUSIVE
+    conflicts with itself (not with readers) and is held until the caller commits, so
+    the next refresh deletes the rows this one inserted and aggregates over its batch too.
+    """
+    if batch_id is None:
+        for statement in CROP_STATISTICS_FULL_REFRESH:
+            conn.execute(text(statement))
+        return
+
+    conn.execute(text(CROP_STATISTICS_DDL))
+    conn.execute(text("LOCK TABLE climatecrop.crop_statistics IN SHARE ROW EXCLUSIVE MODE"))
+    params = {"batch_id": batch_id}
+    conn.execute(text(f"""
+        DELETE FROM climatecrop.crop_statistics
+        WHERE crop_name IN ({_BATCH_CROPS})
+    """), params)
+    conn.execute(text(_CROP_STATISTICS_INSERT.format(
+        crop_filter=f'AND s."Crop" IN ({_BATCH_CROPS})'
+    )), params)
+
+
+def ensure_crop_statistics(conn):
+    """Create and populate the rollup on databases that predate it"""
+    exists = conn.execute(text("SELECT to_regclass('climatecrop.crop_statistics')")).scalar()
+    if exists is None:
+        refresh_crop_statistics(conn)
+        print("✅ Built climatecrop.crop_statistics rollup")
@@ -50,9 +50,19 @@ CREATE TABLE IF NOT EXISTS public.staging_crop_data (
     "Random_Forest_Predicted_Revenue" BIGINT,
     "district" TEXT,
     "Recommended_Pesticide" TEXT,
-    "Variety" TEXT
+    "Variety" TEXT,
+    "load_batch_id" BIGINT,         -- set by every bulk load; used for incremental DWH refresh
+    "staging_row_id" BIGSERIAL      -- unique row id; tiebreaker for keyset pagination
 );
 
+CREATE SEQUENCE IF NOT EXISTS public.staging_load_batch_seq;
+-- When each load batch was loaded: the Last-Modified of the API's read endpoints
+CREATE TABLE IF NOT EXISTS public.staging_load_batches (
+    "load_batch_id" BIGINT PRIMARY KEY,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_staging_load_batch ON public.staging_crop_data ("load_batch_id");
+
 -- ========================================
 -- 3. Create Dimension Tables
 -- ========================================
@@ -99,18 +109,28 @@ CREATE TABLE IF NOT EXISTS climatecrop.fact_crop_yield (
 -- ========================================
 -- 5. Populate Dimension Tables
 -- ========================================
- -- Corrected dimension inserts
+ -- Corrected dimension inserts: one member per idx_dim_*_key key (NULL and '' are
+ -- the same member), other attributes folded with MAX as in refresh_dw
 INSERT INTO climatecrop.dim_crop(crop_name, variety, fertilizer_type, recommended_pesticide)
-SELECT DISTINCT "Crop", "Variety", "Fertilizer_Type", "Recommended_Pesticide"
-FROM public.staging_crop_data;
+SELECT "Crop", MAX("Variety"), MAX("Fertilizer_Type"), MAX("Recommended_Pesticide")
+FROM public.staging_crop_data
+WHERE "Crop" IS NOT NULL
+GROUP BY "Crop", COALESCE("Variety", '')
+ON CONFLICT DO NOTHING;
 
 INSERT INTO climatecrop.dim_location(district, soil_type)
-SELECT DISTINCT "district", "Soil_Type"
-FROM public.staging_crop_data;
+SELECT "district", MAX("Soil_Type")
+FROM public.staging_crop_data
+WHERE "district" IS NOT NULL
+GROUP BY "district", COALESCE("Soil_Type", '')
+ON CONFLICT DO NOTHING;
 
 INSERT INTO climatecrop.dim_time(year, season)
-SELECT DISTINCT "Year", "Season"
-FROM public.staging_crop_data;
+SELECT "Year", MAX("Season")
+FROM public.staging_crop_data
+WHERE "Year" IS NOT NULL
+GROUP BY "Year", COALESCE("Season", '')
+ON CONFLICT DO NOTHING;
 
 
 INSERT INTO climatecrop.fact_crop_yield(
@@ -135,11 +155,66 @@ SELECT
     s."climate_effect_percent"
 FROM public.staging_crop_data s
 JOIN climatecrop.dim_crop c
-    ON s."Crop" = c.crop_name AND s."Variety" = c.variety
+    ON s."Crop" = c.crop_name AND COALESCE(s."Variety", '') = COALESCE(c.variety, '')
 JOIN climatecrop.dim_location l
-    ON s."district" = l.district AND s."Soil_Type" = l.soil_type
+    ON s."district" = l.district AND COALESCE(s."Soil_Type", '') = COALESCE(l.soil_type, '')
 JOIN climatecrop.dim_time t
-    ON s."Year" = t.year AND s."Season" = t.season;
+    ON s."Year" = t.year AND COALESCE(s."Season", '') = COALESCE(t.season, '');
+
+-- Crop x temperature-category statistics rollup (served by /crop-statistics,
+-- rebuilt by refresh_dw in backend/main.py)
+CREATE TABLE IF NOT EXISTS climatecrop.crop_statistics (
+    crop_name TEXT NOT NULL,
+    temp_category TEXT,
+    record_count BIGINT NOT NULL,
+    avg_expected_revenue NUMERIC,
+    avg_total_revenue NUMERIC,
+    avg_yield_kg_per_acre FLOAT,
+    avg_climate_score FLOAT,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO climatecrop.crop_statistics(
+    crop_name, temp_category, record_count,
+    avg_expected_revenue, avg_total_revenue, avg_yield_kg_per_acre, avg_climate_score
+)
+SELECT
+    "Crop",
+    "Temperature_Category",
+    COUNT(*),
+    AVG("expected_revenue"),
+    AVG("Total_Revenue_PKR"),
+    AVG("Avg_Yield_kg_per_acre"),
+    AVG("climate_score")
+FROM public.staging_crop_data
+WHERE "Crop" IS NOT NULL
+GROUP BY "Crop", "Temperature_Category";
+
+-- ========================================
+-- 6. Indexes (one per API query shape, see backend/indexes.py)
+-- ========================================
+CREATE INDEX IF NOT EXISTS idx_staging_crop
+    ON public.staging_crop_data ("Crop");                                       -- /crops
+CREATE INDEX IF NOT EXISTS idx_staging_revenue_keyset
+    ON public.staging_crop_data ("Crop", "Temperature_Category", "expected_revenue" DESC, "staging_row_id" DESC);   -- /revenue-prediction
+CREATE INDEX IF NOT EXISTS idx_staging_climate_keyset
+    ON public.staging_crop_data ("Crop", "Temperature_Category", "climate_score" DESC, "expected_revenue" DESC, "staging_row_id" DESC);  -- /fertilizer-pest-control
+CREATE INDEX IF NOT EXISTS idx_staging_crop_temp_stats
+    ON public.staging_crop_data ("Crop", "Temperature_Category")
+    INCLUDE ("expected_revenue", "Total_Revenue_PKR", "Avg_Yield_kg_per_acre", "climate_score");  -- rollup rebuild
+CREATE INDEX IF NOT EXISTS idx_crop_statistics_crop
+    ON climatecrop.crop_statistics (crop_name, temp_category);                 -- /crop-statistics
+
+CREATE INDEX IF NOT EXISTS idx_fact_crop_id ON climatecrop.fact_crop_yield (crop_id);
+CREATE INDEX IF NOT EXISTS idx_fact_location_id ON climatecrop.fact_crop_yield (location_id);
+CREATE INDEX IF NOT EXISTS idx_fact_time_id ON climatecrop.fact_crop_yield (time_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_crop_key ON climatecrop.dim_crop (crop_name, COALESCE(variety, ''));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_location_key ON climatecrop.dim_location (district, COALESCE(soil_type, ''));
+CREATE UNIQUE INDEX IF NOT EXISTS idx_dim_time_key ON climatecrop.dim_time (year, COALESCE(season, ''));
+
+ANALYZE public.staging_crop_data;
+ANALYZE climatecrop.fact_crop_yield;
 
 -- ========================================
 -- 7. Quick check of table rows
@@ -0,0 +1,342 @@
+"""
+Staging table helpers: schema-driven column conversion and COPY-based bulk loading
+into public.staging_crop_data. Shared by the upload endpoint, the ETL pipeline and
+sql/load_data_to_dw.py so all loaders convert values the same way.
+"""
+import csv
+import io
+import itertools
+import os
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Rows parsed and sent per COPY round-trip
+COPY_BATCH_SIZE = int(os.getenv("COPY_BATCH_SIZE", "50000"))
+
+# Staging table columns and their Postgres types (same order as the CREATE TABLE)
+STAGING_SCHEMA: Dict[str, str] = {
+    "Avg_Price_per_kg": "FLOAT",
+    "Avg_Yield_maunds_per_acre": "FLOAT",
+    "Area_acres": "FLOAT",
+    "Year": "INT",
+    "Max_Price_PKR": "FLOAT",
+    "expected_effect": "FLOAT",
+    "Avg_Yield_kg_per_acre": "FLOAT",
+    "Min_Price_PKR": "FLOAT",
+    "climate_impact_score": "FLOAT",
+    "expected_revenue": "BIGINT",
+    "Crop": "TEXT",
+    "ph": "FLOAT",
+    "Avg_Price_PKR": "FLOAT",
+    "N": "FLOAT",
+    "K": "FLOAT",
+    "revenue_norm": "FLOAT",
+    "expected_risk": "TEXT",
+    "temperature": "TEXT",
+    "Fertilizer_Type": "TEXT",
+    "climate_effect_percent": "FLOAT",
+    "Production_kg": "BIGINT",
+    "temperature_norm": "FLOAT",
+    "rainfall": "FLOAT",
+    "humidity": "FLOAT",
+    "Decision_Tree_Predicted_Revenue": "BIGINT",
+    "Total_Revenue_PKR": "BIGINT",
+    "XGBoost_Tuned_Predicted_Revenue": "BIGINT",
+    "Expected_Disease": "TEXT",
+    "climate_score": "FLOAT",
+    "Season": "TEXT",
+    "Temperature_Category": "TEXT",
+    "Soil_Type": "TEXT",
+    "Production_tons_Copy": "FLOAT",
+    "P": "FLOAT",
+    "XGBoost_Predicted_Revenue": "BIGINT",
+    "rainfall_norm": "FLOAT",
+    "climate_risk_level": "TEXT",
+    "Random_Forest_Predicted_Revenue": "BIGINT",
+    "district": "TEXT",
+    "Recommended_Pesticide": "TEXT",
+    "Variety": "TEXT",
+}
+
+STAGING_COLUMNS: List[str] = list(STAGING_SCHEMA)
+
+# Load batch tracking: every bulk load tags its rows so the DWH can be refreshed incrementally
+BATCH_COLUMN = "load_batch_id"
+BATCH_SEQUENCE = "public.staging_load_batch_seq"
+# One row per load batch with the time it was loaded: the Last-Modified of the data
+# (read with the data watermark, see cache.py)
+BATCH_TABLE = "public.staging_load_batches"
+# Unique, never-null row id: tiebreaker for keyset pagination (filled by its sequence, not by COPY)
+ROW_ID_COLUMN = "staging_row_id"
+
+STAGING_TABLE_DDL = "CREATE TABLE IF NOT EXISTS public.staging_crop_data (\n{}\n);".format(
+    ",\n".join(
+        [f'    "{col}" {pg_type}' for col, pg_type in STAGING_SCHEMA.items()]
+        + [f'    "{BATCH_COLUMN}" BIGINT', f'    "{ROW_ID_COLUMN}" BIGSERIAL']
+    )
+)
+
+# Idempotent DDL that brings staging tables created before batch tracking / row ids up to date
+STAGING_MIGRATIONS = [
+    f'ALTER TABLE public.staging_crop_data ADD COLUMN IF NOT EXISTS "{BATCH_COLUMN}" BIGINT',
+    f"CREATE SEQUENCE IF NOT EXISTS {BATCH_SEQUENCE}",
+    f'CREATE INDEX IF NOT EXISTS idx_staging_load_batch ON public.staging_crop_data ("{BATCH_COLUMN}")',
+    f'ALTER TABLE public.staging_crop_data ADD COLUMN IF NOT EXISTS "{ROW_ID_COLUMN}" BIGSERIAL',
+    f'CREATE TABLE IF NOT EXISTS {BATCH_TABLE} ("{BATCH_COLUMN}" BIGINT PRIMARY KEY, '
+    f'loaded_at TIMESTAMPTZ NOT NULL DEFAULT now())',
+]
+MIGRATED_COLUMNS = [BATCH_COLUMN, ROW_ID_COLUMN]
+
+
+# -----------------------------------
+# Column converters (operate on whole pandas Series of raw CSV strings)
+# -----------------------------------
+def _int_converter(bits: int) -> Callable[[pd.Series], pd.Series]:
+    """
+    Numeric text -> nullable Int64, truncating decimals like int(float(value)).
+    Values outside the column's signed `bits`-bit range (e.g. "1e30") become NULL
+    and are reported as invalid instead of failing the whole load.
+    """
+    low, high = -2.0 ** (bits - 1), 2.0 ** (bits - 1)
+
+    def convert(raw: pd.Series) -> pd.Series:
+        values = np.trunc(pd.to_numeric(raw, errors="coerce").astype("float64"))
+        return values.where((values >= low) & (values < high)).astype("Int64")
+
+    return convert
+
+
+def _to_float(raw: pd.Series) -> pd.Series:
+    """Numeric text -> float64 (NaN for empty or invalid cells)"""
+    return pd.to_numeric(raw, errors="coerce").astype("float64")
+
+
+def _to_text(raw: pd.Series) -> pd.Series:
+    """Strip surrounding whitespace; empty strings become NULL"""
+    values = raw.astype("string").str.strip()
+    return values.mask(values == "")
+
+
+CONVERTERS_BY_TYPE: Dict[str, Callable[[pd.Series], pd.Series]] = {
+    "INT": _int_converter(32),
+    "BIGINT": _int_converter(64),
+    "FLOAT": _to_float,
+    "TEXT": _to_text,
+}
+
+
+class ConversionPlan:
+    """
+    One converter per staging column, built once from STAGING_SCHEMA and applied
+    column-wise to whole batches of raw CSV text.
+    """
+
+    def __init__(self, schema: Dict[str, str] = STAGING_SCHEMA):
+        self.columns = list(schema)
+        self.converters = {col: CONVERTERS_BY_TYPE[pg_type] for col, pg_type in schema.items()}
+        self.numeric_columns = frozenset(col for col, pg_type in schema.items() if pg_type != "TEXT")
+
+    def apply(self, raw: pd.DataFrame, invalid_counts: Optional[Counter] = None) -> pd.DataFrame:
+        """
+        Convert a DataFrame of raw strings (read with dtype=str, keep_default_na=False).
+        Columns missing from the input become NULL and extra columns (e.g. the 'c' index) are dropped.
+        If `invalid_counts` is given, non-empty cells that could not be parsed are counted per column.
+        """
+        converted = {}
+        for col in self.columns:
+            if col not in raw.columns:
+                converted[col] = pd.Series(pd.NA, index=raw.index, dtype="object")
+                continue
+            values = self.converters[col](raw[col])
+            if invalid_counts is not None and col in self.numeric_columns:
+                invalid = int(((raw[col].str.strip() != "") & values.isna()).sum())
+                if invalid:
+                    invalid_counts[col] += invalid
+            converted[col] = values
+        return pd.DataFrame(converted, index=raw.index)
+
+
+CONVERSION_PLAN = ConversionPlan()
+
+
+def _lenient_batches(source, batch_size: int, skip: int) -> Iterator[pd.DataFrame]:
+    """
+    Raw string batches read with csv.DictReader, which (unlike pandas) never rejects a
+    line: an unterminated quote swallows the rest of the file into one field, extra
+    fields are dropped and missing ones are empty. The first `skip` rows are skipped.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        text = open(source, newline="", encoding="utf-8")
+    else:
+        text = io.TextIOWrapper(source, encoding="utf-8", newline="")
+    try:
+        reader = csv.DictReader(text)
+        rows = itertools.islice(reader, skip, None)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            columns = [col for col in reader.fieldnames if col is not None]
+            yield pd.DataFrame(
+                [[row.get(col) or "" for col in columns] for row in batch],
+                columns=columns,
+                dtype=str,
+            )
+    finally:
+        if isinstance(text, io.TextIOWrapper) and not isinstance(source, (str, os.PathLike)):
+            # Leave the caller's file object open
+            text.detach()
+        else:
+            text.close()
+
+
+def read_csv_batches(source, batch_size: Optional[int] = None,
+                     plan: ConversionPlan = CONVERSION_PLAN,
+                     invalid_counts: Optional[Counter] = None,
+                     on_parse_error: Optional[Callable[[str], None]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Parse a CSV (path or binary file object) in fixed-size chunks and yield converted batches.
+    Only `batch_size` rows are held in memory at a time.
+
+    A malformed line (e.g. an unterminated quote) does not fail the load: the error is
+    passed to `on_parse_error(message)` and the rest of the file is read with the
+    lenient csv module reader, as loaders did before the pandas parser.
+    """
+    batch_size = batch_size or COPY_BATCH_SIZE
+    start = source.tell() if hasattr(source, "seek") else None
+    yielded = 0
+    try:
+        reader = pd.read_csv(
+            source,
+            dtype=str,
+            keep_default_na=False,
+            encoding="utf-8",
+            chunksize=batch_size,
+            usecols=lambda col: col in plan.converters,
+        )
+        with reader:
+            for raw in reader:
+                yielded += len(raw)
+                yield plan.apply(raw, invalid_counts)
+        return
+    except pd.errors.ParserError as e:
+        if start is None and not isinstance(source, (str, os.PathLike)):
+            raise
+        message = f"Malformed CSV: {str(e).strip()}"
+    print(f"⚠️ {message}; reading the rest with the lenient parser")
+    if on_parse_error:
+        on_parse_error(message)
+    if start is not None:
+        source.seek(start)
+    # Rows before the malformed line were already yielded
+    for raw in _lenient_batches(source, batch_size, skip=yielded):
+        yield plan.apply(raw, invalid_counts)
+
+
+# -----------------------------------
+# COPY loader
+# -----------------------------------
+def _copy_sql(columns: List[str]) -> str:
+    column_list = ", ".join('"' + col + '"' for col in columns)
+    return f"COPY public.staging_crop_data ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '')"
+
+
+def _dbapi_connection(conn):
+    """Accept either a raw psycopg2 connection or a SQLAlchemy Connection"""
+    return conn if hasattr(conn, "cursor") else conn.connection
+
+
+def ensure_staging_schema(conn):
+    """
+    Apply STAGING_MIGRATIONS if a migrated column or the batch table is missing (runs in the
+    caller's transaction). The catalog check avoids taking table locks on already migrated databases.
+    """
+    cursor = _dbapi_connection(conn).cursor()
+    try:
+        cursor.execute(
+            "SELECT count(*), to_regclass(%s) IS NOT NULL FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = 'staging_crop_data' AND column_name = ANY(%s)",
+            (BATCH_TABLE, MIGRATED_COLUMNS)
+        )
+        migrated_columns, has_batch_table = cursor.fetchone()
+        if migrated_columns < len(MIGRATED_COLUMNS) or not has_batch_table:
+            for statement in STAGING_MIGRATIONS:
+                cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def next_batch_id(conn) -> int:
+    """Allocate a new load batch id and record its load time (committed with the load)"""
+    cursor = _dbapi_connection(conn).cursor()
+    try:
+        cursor.execute(
+            f'INSERT INTO {BATCH_TABLE} ("{BATCH_COLUMN}") VALUES (nextval(\'{BATCH_SEQUENCE}\')) '
+            f'RETURNING "{BATCH_COLUMN}"'
+        )
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def copy_frames(conn, frames: Iterable[pd.DataFrame], on_batch=None, batch_id: Optional[int] = None) -> int:
+    """
+    COPY converted batches into public.staging_crop_data, one round-trip per batch.
+
+    Runs inside the caller's open transaction (no commit/rollback here).
+    Rows are tagged with `batch_id` when given. `on_batch(total_rows)` is called after
+    each batch. Returns the number of rows copied.
+    """
+    cursor = _dbapi_connection(conn).cursor()
+    buffer = io.StringIO()
+    total = 0
+    try:
+        for frame in frames:
+            if frame.empty:
+                continue
+            if batch_id is not None:
+                frame = frame.assign(**{BATCH_COLUMN: batch_id})
+            frame.to_csv(buffer, header=False, index=False, na_rep="", lineterminator="\n")
+            buffer.seek(0)
+            cursor.copy_expert(_copy_sql(list(frame.columns)), buffer)
+            buffer.seek(0)
+            buffer.truncate(0)
+            total += len(frame)
+            if on_batch:
+                on_batch(total)
+    finally:
+        cursor.close()
+    return total
+
+
+def _count_parsed(frames: Iterable[pd.DataFrame], on_parsed) -> Iterator[pd.DataFrame]:
+    total = 0
+    for frame in frames:
+        total += len(frame)
+        on_parsed(total)
+        yield frame
+
+
+def load_csv(conn, source, batch_size: Optional[int] = None, on_batch=None,
+             batch_id: Optional[int] = None, on_parsed=None):
+    """
+    Parse `source` with the shared conversion plan and COPY it into staging.
+    `on_parsed(total_rows)` / `on_batch(total_rows)` report parse and load progress.
+    Returns (rows_copied, errors) where errors reports malformed CSV and columns with
+    unparseable values.
+    """
+    invalid_counts = Counter()
+    parse_errors = []
+    frames = read_csv_batches(source, batch_size, invalid_counts=invalid_counts,
+                              on_parse_error=parse_errors.append)
+    if on_parsed:
+        frames = _count_parsed(frames, on_parsed)
+    rows = copy_frames(conn, frames, on_batch, batch_id=batch_id)
+    errors = parse_errors + [
+        f"Column {col}: {count} value(s) could not be converted and were stored as NULL"
+        for col, count in invalid_counts.items()
+    ]
+    return rows, errors
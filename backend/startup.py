@@ -0,0 +1,86 @@
+"""
+Background initialization of slow startup work (chatbot RAG index, schema/index prep)
+The API starts serving immediately; each InitTask reports its state for /ready
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+PENDING, BUILDING, READY, FAILED = "pending", "building", "ready", "failed"
+
+
+class InitTask:
+    """One piece of startup work run on a daemon thread: pending -> building -> ready | failed"""
+
+    def __init__(self, name: str, fn: Callable[[], object], required: bool = False):
+        self.name = name
+        self.fn = fn
+        # Required tasks must be ready before /ready reports the service as ready
+        self.required = required
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_monotonic: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Start (or retry after a failure) in the background; False if already building/ready"""
+        with self._lock:
+            if self.state in (BUILDING, READY):
+                return False
+            self.state = BUILDING
+            self.error = None
+            self.started_at = datetime.now()
+            self._started_monotonic = time.monotonic()
+            self.finished_at = self._finished_monotonic = None
+        threading.Thread(target=self._run, name=f"init-{self.name}", daemon=True).start()
+        return True
+
+    def _run(self):
+        print(f"🔄 Background init '{self.name}' started")
+        try:
+            self.fn()
+        except Exception as e:
+            with self._lock:
+                self.state = FAILED
+                self.error = str(e)
+                self.finished_at = datetime.now()
+                self._finished_monotonic = time.monotonic()
+            print(f"⚠️ Background init '{self.name}' failed: {e}")
+            return
+        with self._lock:
+            self.state = READY
+            self.finished_at = datetime.now()
+            self._finished_monotonic = time.monotonic()
+        print(f"✅ Background init '{self.name}' ready")
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            if self._started_monotonic is None:
+                elapsed = None
+            else:
+                end = self._finished_monotonic or time.monotonic()
+                elapsed = round(end - self._started_monotonic, 3)
+            return {
+                "state": self.state,
+                "required": self.required,
+                "error": self.error,
+                "elapsed_seconds": elapsed,
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+
+def readiness(tasks: List[InitTask]) -> Dict:
+    """Overall readiness: every required task is ready"""
+    return {
+        "ready": all(task.ready for task in tasks if task.required),
+        "components": {task.name: task.to_dict() for task in tasks},
+    }
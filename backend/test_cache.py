@@ -0,0 +1,238 @@
+"""
+Unit tests for the response cache (cache.py): LRU/TTL entries, stampede coalescing,
+data-version invalidation, the database watermark and the ETag / Last-Modified validators
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import cache as cache_module
+from cache import LRUCache, ResponseCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a", "gone") == "gone"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"rows": [1, 2, 3]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("crops", compute)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Let every follower reach the leader's in-flight future before it finishes
+    time.sleep(0.1)
+    assert cache.stats()["inflight"] == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert all(result == {"rows": [1, 2, 3]} for result in results)
+    assert cache.stats()["inflight"] == 0
+    # Now cached
+    assert cache.get_or_compute("crops", lambda: pytest.fail("recomputed")) == {"rows": [1, 2, 3]}
+
+
+def test_leader_exception_is_shared_and_not_cached():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("database down")
+
+    errors = []
+
+    def worker():
+        try:
+            cache.get_or_compute("crops", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert errors == ["database down"] * 4
+    assert cache.get_or_compute("crops", lambda: "ok") == "ok"
+
+
+def test_result_computed_across_a_version_bump_is_not_stored():
+    cache = ResponseCache(maxsize=10, ttl=None)
+
+    def compute():
+        cache.bump_version()
+        return "stale"
+
+    value, etag, _ = cache.lookup("crops", compute)
+    assert value == "stale"
+    # The validators are those of the version the lookup started under
+    assert etag != cache.validators()[0]
+    assert cache.get_or_compute("crops", lambda: "fresh") == "fresh"
+
+
+def test_bump_version_invalidates_entries_and_changes_validators():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    cache.get_or_compute("crops", lambda: "old")
+    version = cache.data_version
+    etag, modified_at = cache.validators()
+    assert cache.bump_version() == version + 1
+    assert len(cache) == 0
+    assert cache.validators()[0] != etag
+    assert cache.validators()[1] >= modified_at
+    assert cache.get_or_compute("crops", lambda: "new") == "new"
+
+
+def test_lookup_returns_the_current_validators():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    value, etag, modified_at = cache.lookup("crops", lambda: ["Wheat"])
+    assert value == ["Wheat"]
+    assert (etag, modified_at) == cache.validators()
+    assert etag.startswith('W/"') and etag.endswith('"')
+    # A hit carries the same validators
+    assert cache.lookup("crops", lambda: pytest.fail("recomputed")) == (["Wheat"], etag, modified_at)
+
+
+def test_async_lookups_coalesce():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["Wheat", "Rice"]
+
+    async def main():
+        return await asyncio.gather(*(cache.lookup_async("crops", compute) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert {tuple(result[0]) for result in results} == {("Wheat", "Rice")}
+
+
+def test_sync_and_async_callers_share_a_computation():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return "shared"
+
+    leader = threading.Thread(target=cache.lookup, args=("k", compute))
+    leader.start()
+    started.wait(5)
+
+    async def main():
+        waiter = asyncio.ensure_future(cache.lookup_async("k", lambda: pytest.fail("recomputed")))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await waiter
+
+    assert asyncio.run(main())[0] == "shared"
+    leader.join(5)
+
+
+def test_cancelled_async_leader_hands_over_to_a_waiter():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05 if len(calls) > 1 else 10)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(cache.lookup_async("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(cache.lookup_async("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    value, _, _ = asyncio.run(main())
+    assert value == 2
+    assert len(calls) == 2
+
+
+def test_watermark_change_bumps_version():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    assert cache.claim_watermark_check(interval=60)
+    assert not cache.claim_watermark_check(interval=60)
+    assert not cache.claim_watermark_check(interval=0)
+
+    version = cache.data_version
+    # The first observation only records the baseline
+    assert not cache.observe_watermark((3, 100, 5000))
+    assert not cache.observe_watermark((3, 100, 5000))
+    assert cache.data_version == version
+
+    cache.get_or_compute("crops", lambda: "old")
+    assert cache.observe_watermark((3, 100, 5200))
+    assert cache.data_version == version + 1
+    assert cache.get_or_compute("crops", lambda: "new") == "new"
+
+
+def test_last_modified_comes_from_the_last_load_and_only_moves_forward(monkeypatch):
+    now = [2_000_000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ResponseCache(maxsize=10, ttl=None)
+
+    # A freshly started process dates the data by its last load, not by its own start
+    assert not cache.observe_watermark((3, 100, 5000), 1_000_000.0)
+    assert cache.validators()[1] == 1_000_000.0
+
+    # A new load batch dates the change
+    assert cache.observe_watermark((3, 100, 5200), 1_500_000.0)
+    assert cache.validators()[1] == 1_500_000.0
+
+    # A change without a newer load (e.g. rows deleted by hand) is dated when it was noticed
+    now[0] += 60
+    assert cache.observe_watermark((3, 100, 5300), 1_500_000.0)
+    assert cache.validators()[1] == 2_000_060.0
+    cache.bump_version(1_800_000.0)
+    assert cache.validators()[1] == 2_000_060.0
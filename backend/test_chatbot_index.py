@@ -0,0 +1,92 @@
+"""
+Unit tests for the chatbot's vector index sources (chatbot.py): rows loaded from the CSV
+and then through staging end up with one set of chunks
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("google.generativeai")
+
+import chatbot as chatbot_module
+from chatbot import ChatbotRAG
+from staging import ROW_ID_COLUMN
+
+ROWS = pd.DataFrame({
+    "Crop": ["Wheat", "Wheat", "Rice"],
+    "Variety": ["Galaxy", "Galaxy", "Basmati"],
+    "district": ["Multan", "Multan", "Lahore"],
+    "Season": ["Rabi", "Rabi", "Kharif"],
+    "Year": [2020, 2020, 2021],
+    "expected_revenue": [125000.0, 125000.0, 98000.0],
+})
+
+
+class FakeEmbeddingPool:
+    def embed(self, texts):
+        return np.array([[len(text), text.count(" "), 1.0] for text in texts], dtype=np.float32)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeModel:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt):
+        return "OK"
+
+
+@pytest.fixture
+def csv_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(chatbot_module, "VECTORDB_PATH", str(tmp_path / "vectordb"))
+    monkeypatch.setattr(chatbot_module, "EmbeddingPool", FakeEmbeddingPool)
+    monkeypatch.setattr(chatbot_module.genai, "configure", lambda **kwargs: None)
+    monkeypatch.setattr(chatbot_module.genai, "GenerativeModel", FakeModel)
+    path = tmp_path / "crops.csv"
+    ROWS.to_csv(path, index=False)
+    return path
+
+
+def chunk_sources(chatbot):
+    return sorted(metadata["source"] for metadata in chatbot.vector_store.get(include=["metadatas"])["metadatas"])
+
+
+def test_rows_indexed_from_csv_then_staging_keep_one_chunk_each(csv_path):
+    # Startup before the pipeline ran: the CSV is the source
+    chatbot = ChatbotRAG(csv_path=str(csv_path))
+    chatbot.initialize()
+    assert chunk_sources(chatbot) == ["csv"] * 3
+    assert not chatbot.staging_indexed
+
+    # The pipeline loads the same rows into staging and mirrors it into the index
+    staging = ROWS.assign(**{ROW_ID_COLUMN: [1, 2, 3]})
+    stats = chatbot.index_frames([staging], source="staging", prune=True)
+    chatbot.mark_staging_indexed()
+    assert stats["removed"] == 3
+    assert chunk_sources(chatbot) == ["staging"] * 3
+
+    # A later startup with staging rows does not index the CSV again, even after it changed
+    ROWS.iloc[:2].to_csv(csv_path, index=False)
+    restarted = ChatbotRAG(csv_path=str(csv_path))
+    restarted.initialize(index_csv=False)
+    assert restarted.staging_indexed
+    assert chunk_sources(restarted) == ["staging"] * 3
+
+
+def test_csv_is_indexed_again_when_staging_is_no_longer_the_source(csv_path):
+    chatbot = ChatbotRAG(csv_path=str(csv_path))
+    chatbot.initialize(index_csv=False)
+    chatbot.index_frames([ROWS.assign(**{ROW_ID_COLUMN: [1, 2, 3]})], source="staging", prune=True)
+    chatbot.mark_staging_indexed()
+
+    # Staging was emptied: the CSV takes over and the staging chunks go
+    restarted = ChatbotRAG(csv_path=str(csv_path))
+    restarted.initialize()
+    assert not restarted.staging_indexed
+    assert chunk_sources(restarted) == ["csv"] * 3
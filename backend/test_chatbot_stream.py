@@ -0,0 +1,93 @@
+"""
+Unit tests for the streamed chatbot answers (ChatbotRAG.chat_stream): every stream ends
+with exactly one terminal event
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("google.generativeai")
+
+from chatbot import ChatbotRAG, StreamInterrupted
+from llm_client import LimitedLLMClient, LLMClient
+
+
+class FakeClient(LLMClient):
+    name = "fake"
+
+    def __init__(self, pieces, fail_after=None, delay=0.0):
+        self.pieces = pieces
+        self.fail_after = fail_after
+        self.delay = delay
+
+    async def generate(self, prompt: str) -> str:
+        return "".join(self.pieces)
+
+    async def stream(self, prompt: str):
+        for n, piece in enumerate(self.pieces):
+            if n == self.fail_after:
+                raise RuntimeError("Gemini connection reset")
+            await asyncio.sleep(self.delay)
+            yield piece
+
+
+def make_chatbot(client):
+    chatbot = ChatbotRAG()
+    chatbot.llm = LimitedLLMClient(client, rate_per_minute=0)
+
+    async def embed(query):
+        return [0.0, 1.0]
+
+    async def search(query, k=5, query_embedding=None):
+        return ["Crop Information for Wheat:"]
+
+    chatbot._embed_query = embed
+    chatbot.search_relevant_context = search
+    return chatbot
+
+
+async def collect(events, into):
+    async for event in events:
+        into.append(event)
+
+
+def test_stream_ends_with_done():
+    chatbot = make_chatbot(FakeClient(["Wheat ", "grows ", "well"]))
+    events = []
+    asyncio.run(collect(chatbot.chat_stream("wheat?", "r1"), events))
+    assert [event["event"] for event in events] == ["metadata", "token", "token", "token", "done"]
+
+
+def test_gemini_failure_mid_stream_ends_with_an_error_not_done():
+    chatbot = make_chatbot(FakeClient(["Wheat ", "grows ", "well"], fail_after=2))
+    events = []
+    with pytest.raises(StreamInterrupted):
+        asyncio.run(collect(chatbot.chat_stream("wheat?", "r1"), events))
+    assert [event["event"] for event in events] == ["metadata", "token", "token"]
+    # The partial answer is not cached
+    assert chatbot.answer_cache.lookup("en", "wheat?", [0.0, 1.0]) is None
+
+
+def test_gemini_failure_before_any_token_sends_the_fallback_answer():
+    chatbot = make_chatbot(FakeClient(["Wheat"], fail_after=0))
+    events = []
+    asyncio.run(collect(chatbot.chat_stream("wheat?", "r1"), events))
+    assert [event["event"] for event in events] == ["metadata", "token", "done"]
+
+
+def test_stream_replaced_by_a_newer_request_ends_with_cancelled():
+    chatbot = make_chatbot(FakeClient(["Wheat ", "grows ", "well"], delay=0.05))
+
+    async def main():
+        first, second = [], []
+        older = asyncio.ensure_future(collect(chatbot.chat_stream("wheat?", "user-1"), first))
+        await asyncio.sleep(0.07)
+        await collect(chatbot.chat_stream("rice?", "user-1"), second)
+        await older
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first[-1] == {"event": "cancelled", "data": {"request_id": "user-1", "detail": "Replaced by a newer request"}}
+    assert "done" not in [event["event"] for event in first]
+    assert second[-1]["event"] == "done"
@@ -0,0 +1,82 @@
+"""
+Unit tests for response format negotiation and the columnar layout (formats.py)
+"""
+import json
+from decimal import Decimal
+
+import pytest
+
+import formats
+from formats import COLUMNAR_MEDIA_TYPE, UnsupportedFormat, negotiate_format, render, to_columnar
+
+
+@pytest.mark.parametrize("format_param, accept, expected", [
+    (None, None, "json"),
+    (None, "", "json"),
+    (None, "*/*", "json"),
+    (None, "text/html, application/json", "json"),
+    (None, COLUMNAR_MEDIA_TYPE, "columnar"),
+    (None, f"text/html;q=0.9, {COLUMNAR_MEDIA_TYPE}", "columnar"),
+    (None, "application/x-msgpack", "msgpack"),
+    (None, "Application/MsgPack", "msgpack"),
+    # q=0 means "not acceptable"
+    (None, f"{COLUMNAR_MEDIA_TYPE};q=0, application/msgpack", "msgpack"),
+    (None, "application/msgpack; q=0.0", "json"),
+    # An explicit ?format= wins over Accept
+    ("columnar", "application/msgpack", "columnar"),
+    ("JSON", COLUMNAR_MEDIA_TYPE, "json"),
+])
+def test_negotiate_format(format_param, accept, expected):
+    assert negotiate_format(format_param, accept) == expected
+
+
+def test_unknown_format_param_is_rejected():
+    with pytest.raises(UnsupportedFormat):
+        negotiate_format("xml", None)
+
+
+def test_msgpack_unavailable_without_the_library(monkeypatch):
+    monkeypatch.setattr(formats, "msgpack", None)
+    assert "msgpack" not in formats.available_formats()
+    with pytest.raises(UnsupportedFormat):
+        negotiate_format("msgpack", None)
+    assert negotiate_format(None, "application/msgpack, application/json") == "json"
+
+
+def test_to_columnar_transposes_data_rows():
+    body = {"crop": "Wheat", "count": 2, "data": [{"year": 2020, "revenue": 10}, {"year": 2021, "revenue": None}]}
+    assert to_columnar(body) == {"crop": "Wheat", "count": 2, "data": {"year": [2020, 2021], "revenue": [10, None]}}
+
+
+def test_to_columnar_transposes_nested_batch_results():
+    body = {"results": [
+        {"crop": "Wheat", "data": [{"a": 1}, {"a": 2}]},
+        {"crop": "Rice", "data": [], "error": "No predictions found"},
+    ]}
+    assert to_columnar(body) == {"results": [
+        {"crop": "Wheat", "data": {"a": [1, 2]}},
+        {"crop": "Rice", "data": {}, "error": "No predictions found"},
+    ]}
+
+
+def test_to_columnar_leaves_other_lists_alone():
+    body = {"all_crops": ["Wheat", "Rice"], "data": ["not", "rows"]}
+    assert to_columnar(body) == body
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_render_columnar(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(formats, "orjson", None)
+    elif formats.orjson is None:
+        pytest.skip("orjson not installed")
+    content, media_type = render({"data": [{"price": Decimal("2.5"), "crop": "Wheat"}]}, "columnar")
+    assert media_type == COLUMNAR_MEDIA_TYPE
+    assert json.loads(content) == {"data": {"price": [2.5], "crop": ["Wheat"]}}
+
+
+def test_render_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    content, media_type = render({"data": [{"year": 2020}, {"year": 2021}]}, "msgpack")
+    assert media_type == "application/msgpack"
+    assert msgpack.unpackb(content) == {"data": {"year": [2020, 2021]}}
@@ -0,0 +1,185 @@
+"""
+Unit tests for the LLM client layer (llm_client.py): token buckets, the concurrency
+cap, the bounded wait queue and per-client rate limits
+"""
+import asyncio
+
+import pytest
+
+import llm_client
+from concurrency import Overloaded
+from llm_client import LimitedLLMClient, LLMClient, TokenBucket
+
+
+class FakeClient(LLMClient):
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0, pieces=("Wheat ", "grows ", "well")):
+        self.delay = delay
+        self.pieces = pieces
+        self.running = 0
+        self.max_running = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if prompt == "fail":
+                raise RuntimeError("LLM error")
+            return f"answer to {prompt}"
+        finally:
+            self.running -= 1
+
+    async def stream(self, prompt: str):
+        for piece in self.pieces:
+            await asyncio.sleep(self.delay)
+            yield piece
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    return clock
+
+
+def test_llm_client_is_abstract():
+    with pytest.raises(TypeError):
+        LLMClient()
+
+
+def test_token_bucket_allows_burst_then_reports_wait(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.5)
+
+
+def test_token_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    bucket.take()
+    bucket.take()
+    clock.now += 100
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, pytest.approx(1.0)]
+
+
+def test_generate_passes_through_and_counts():
+    client = LimitedLLMClient(FakeClient(), rate_per_minute=0)
+    assert asyncio.run(client.generate("hi")) == "answer to hi"
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.generate("fail"))
+    stats = client.stats()
+    assert stats["completed"] == 1
+    assert stats["failed"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["client"] == "fake"
+
+
+def test_concurrency_is_capped():
+    fake = FakeClient(delay=0.02)
+    client = LimitedLLMClient(fake, max_concurrency=2, max_queue=10, queue_timeout=5, rate_per_minute=0)
+
+    async def main():
+        return await asyncio.gather(*(client.generate(str(i)) for i in range(6)))
+
+    assert asyncio.run(main()) == [f"answer to {i}" for i in range(6)]
+    assert fake.max_running == 2
+    assert client.stats()["max_waiting"] == 4
+
+
+def test_simultaneous_burst_beyond_queue_is_shed():
+    client = LimitedLLMClient(FakeClient(delay=0.05), max_concurrency=2, max_queue=1, queue_timeout=5,
+                              rate_per_minute=0)
+
+    async def main():
+        return await asyncio.gather(*(client.generate(str(i)) for i in range(5)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    shed = [result for result in results if isinstance(result, Overloaded)]
+    assert len(shed) == 2
+    assert all(error.status_code == 503 and error.retry_after > 0 for error in shed)
+    assert client.stats()["shed_queue_full"] == 2
+    assert client.stats()["completed"] == 3
+
+
+def test_queue_timeout_sheds_waiters():
+    client = LimitedLLMClient(FakeClient(delay=0.2), max_concurrency=1, max_queue=5, queue_timeout=0.05,
+                              rate_per_minute=0)
+
+    async def main():
+        return await asyncio.gather(client.generate("a"), client.generate("b"), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert first == "answer to a"
+    assert isinstance(second, Overloaded) and second.status_code == 503
+    assert client.stats()["shed_queue_timeout"] == 1
+
+
+def test_per_client_rate_limit(clock):
+    client = LimitedLLMClient(FakeClient(), rate_per_minute=60, burst=2)
+
+    async def main():
+        results = []
+        for client_id in ["alice", "alice", "alice", "bob"]:
+            try:
+                results.append(await client.generate("q", client_id=client_id))
+            except Overloaded as e:
+                results.append(e)
+        return results
+
+    results = asyncio.run(main())
+    assert results[:2] == ["answer to q"] * 2
+    assert isinstance(results[2], Overloaded)
+    assert results[2].status_code == 429
+    assert results[2].retry_after == pytest.approx(1.0)
+    # Another client has its own bucket
+    assert results[3] == "answer to q"
+    assert client.stats()["rate_limited"] == 1
+
+
+def test_stream_holds_its_slot_until_finished():
+    fake = FakeClient(delay=0.01)
+    client = LimitedLLMClient(fake, max_concurrency=1, max_queue=0, queue_timeout=1, rate_per_minute=0)
+
+    async def main():
+        pieces = []
+        stream = client.stream("q")
+        pieces.append(await stream.__anext__())
+        # The stream is still open, so its slot is taken and the queue is empty
+        with pytest.raises(Overloaded):
+            await client.generate("other")
+        async for piece in stream:
+            pieces.append(piece)
+        return pieces
+
+    assert asyncio.run(main()) == ["Wheat ", "grows ", "well"]
+    stats = client.stats()
+    assert stats["streams"] == 1
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+    assert asyncio.run(client.generate("after")) == "answer to after"
+
+
+def test_closed_stream_releases_its_slot():
+    client = LimitedLLMClient(FakeClient(), max_concurrency=1, max_queue=0, queue_timeout=1, rate_per_minute=0)
+
+    async def main():
+        stream = client.stream("q")
+        await stream.__anext__()
+        await stream.aclose()
+        return await client.generate("next")
+
+    assert asyncio.run(main()) == "answer to next"
+    assert client.stats()["failed"] == 1
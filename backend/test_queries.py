@@ -0,0 +1,118 @@
+"""
+Unit tests for keyset pagination and continuation tokens (queries.py).
+The keyset predicates run on SQLite, with the Postgres ordering (DESC NULLS FIRST).
+"""
+import sqlite3
+
+import pytest
+
+from queries import decode_cursor, encode_cursor, keyset_predicate
+
+ROWS = [
+    # (row_id, score, revenue): NULLs and ties in both sort keys
+    (1, None, 10), (2, 5.0, None), (3, 5.0, 20), (4, None, None), (5, 7.5, 20),
+    (6, 5.0, 20), (7, None, 10), (8, 7.5, None), (9, 1.0, 5), (10, 5.0, None),
+]
+COLUMNS = ["score", "revenue", "row_id"]
+ORDER_BY = "score DESC NULLS FIRST, revenue DESC NULLS FIRST, row_id DESC"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (row_id INTEGER PRIMARY KEY, score REAL, revenue INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    yield conn
+    conn.close()
+
+
+def fetch(conn, keyset: str = "", params=None, limit: int = 100):
+    sql = f"SELECT score, revenue, row_id FROM t WHERE 1 = 1 {keyset} ORDER BY {ORDER_BY} LIMIT {limit}"
+    return conn.execute(sql, params or {}).fetchall()
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 4, 10])
+def test_keyset_pages_cover_every_row_once_in_order(conn, page_size):
+    expected = fetch(conn)
+    pages, keyset, params = [], "", {}
+    while True:
+        page = fetch(conn, keyset, params, page_size)
+        if not page:
+            break
+        pages.extend(page)
+        keyset, params = keyset_predicate(COLUMNS, list(page[-1]))
+    assert pages == expected
+
+
+@pytest.mark.parametrize("index", range(len(ROWS)))
+def test_keyset_predicate_starts_right_after_cursor(conn, index):
+    ordered = fetch(conn)
+    keyset, params = keyset_predicate(COLUMNS, list(ordered[index]))
+    assert fetch(conn, keyset, params) == ordered[index + 1:]
+
+
+def test_keyset_predicate_null_cursor_stays_in_null_group():
+    sql, params = keyset_predicate(["a", "id"], [None, 7])
+    assert "a IS NULL" in sql and "a IS NOT NULL" in sql
+    assert params == {"after_1": 7}
+    # No leading-key bound for a NULL cursor value
+    assert "<= :after_0" not in sql
+
+
+def test_keyset_predicate_bounds_leading_key():
+    sql, params = keyset_predicate(["a", "id"], [3.5, 7])
+    assert sql.endswith("AND a <= :after_0")
+    assert params == {"after_0": 3.5, "after_1": 7}
+
+
+REVENUE = ["expected_revenue", "row_id"]
+FERTILIZER = ["climate_score", "expected_revenue", "row_id"]
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(["Wheat", "Hot", 50], [81.5, None, 42])
+    assert "=" not in token
+    assert decode_cursor(token, ["Wheat", "Hot", 50], FERTILIZER) == [81.5, None, 42]
+
+
+def test_cursor_float_field_accepts_integers():
+    token = encode_cursor(["Wheat"], [82, 1200, 42])
+    after = decode_cursor(token, ["Wheat"], FERTILIZER)
+    assert after == [82.0, 1200, 42] and isinstance(after[0], float)
+
+
+@pytest.mark.parametrize("scope", [["Rice", "Hot", 50], ["Wheat", "Cold", 50], ["Wheat", "Hot", 10], ["Wheat", "Hot"]])
+def test_cursor_rejected_for_another_scope(scope):
+    token = encode_cursor(["Wheat", "Hot", 50], [1200, 42])
+    with pytest.raises(ValueError, match="does not belong"):
+        decode_cursor(token, scope, REVENUE)
+
+
+def test_cursor_rejected_for_wrong_size():
+    token = encode_cursor(["Wheat"], [1200, 42])
+    with pytest.raises(ValueError, match="does not belong"):
+        decode_cursor(token, ["Wheat"], FERTILIZER)
+
+
+@pytest.mark.parametrize("values", [
+    [1200, None], [1200, "42"], [True, 42], [{"a": 1}, 42],
+    # BIGINT fields: no floats, nothing outside the column range
+    [1200, 42.0], [1200, 4.2], [1200.5, 42], [1200, 2 ** 63], [-(2 ** 63) - 1, 42],
+])
+def test_cursor_rejects_values_of_the_wrong_type(values):
+    token = encode_cursor(["Wheat"], values)
+    with pytest.raises(ValueError, match="Malformed"):
+        decode_cursor(token, ["Wheat"], REVENUE)
+
+
+@pytest.mark.parametrize("climate_score", [float("nan"), float("inf"), 10 ** 400, "81.5"])
+def test_cursor_rejects_non_finite_float_field(climate_score):
+    token = encode_cursor(["Wheat"], [climate_score, 1200, 42])
+    with pytest.raises(ValueError, match="Malformed"):
+        decode_cursor(token, ["Wheat"], FERTILIZER)
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "bnVsbA", encode_cursor(["Wheat"], [1, 2])[:-3]])
+def test_cursor_rejects_garbage(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, ["Wheat"], REVENUE)
@@ -0,0 +1,139 @@
+"""
+Unit tests for the staging column converters, the batched CSV reader and the COPY loader (staging.py)
+"""
+import io
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from staging import CONVERTERS_BY_TYPE, ConversionPlan, copy_frames, load_csv, read_csv_batches
+
+
+class FakeCursor:
+    def __init__(self, copies):
+        self.copies = copies
+        self.closed = False
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection: records every COPY"""
+
+    def __init__(self):
+        self.copies = []
+
+    def cursor(self):
+        return FakeCursor(self.copies)
+
+
+def raw(*values):
+    return pd.Series(values, dtype=str)
+
+
+def test_int_converter_truncates_like_int_float():
+    converted = CONVERTERS_BY_TYPE["INT"](raw("2020", "2020.9", "-3.7", " 42 ", "1e3"))
+    assert converted.tolist() == [2020, 2020, -3, 42, 1000]
+    assert str(converted.dtype) == "Int64"
+
+
+def test_int_converter_nulls_empty_and_invalid():
+    converted = CONVERTERS_BY_TYPE["INT"](raw("", "abc", "nan", "7"))
+    assert converted.isna().tolist() == [True, True, True, False]
+
+
+@pytest.mark.parametrize("pg_type, in_range, out_of_range", [
+    ("INT", ["2147483647", "-2147483648"], ["2147483648", "-2147483649", "1e30"]),
+    ("BIGINT", ["9007199254740992", "-9000000000000000000"], ["9223372036854775808", "1e30", "-1e19"]),
+])
+def test_int_converter_nulls_values_outside_the_column_range(pg_type, in_range, out_of_range):
+    converted = CONVERTERS_BY_TYPE[pg_type](raw(*in_range, *out_of_range))
+    assert converted.notna().tolist() == [True] * len(in_range) + [False] * len(out_of_range)
+
+
+def test_float_converter():
+    converted = CONVERTERS_BY_TYPE["FLOAT"](raw("1.5", "", "x", "-2"))
+    assert converted.iloc[0] == 1.5 and converted.iloc[3] == -2.0
+    assert converted.isna().tolist() == [False, True, True, False]
+
+
+def test_text_converter_strips_and_nulls_empty():
+    converted = CONVERTERS_BY_TYPE["TEXT"](raw(" Wheat ", "", "   ", "Rice"))
+    assert converted.tolist()[0] == "Wheat" and converted.tolist()[3] == "Rice"
+    assert converted.isna().tolist() == [False, True, True, False]
+
+
+PLAN = ConversionPlan({"Crop": "TEXT", "Year": "INT", "expected_revenue": "BIGINT", "rainfall": "FLOAT"})
+
+
+def test_conversion_plan_counts_invalid_cells_and_fills_missing_columns():
+    frame = pd.DataFrame({"Crop": ["Wheat", ""], "Year": ["2020", "soon"], "c": ["0", "1"]}, dtype=str)
+    invalid = Counter()
+    converted = PLAN.apply(frame, invalid)
+    assert list(converted.columns) == ["Crop", "Year", "expected_revenue", "rainfall"]
+    assert converted["expected_revenue"].isna().all()
+    assert invalid == Counter({"Year": 1})
+
+
+def test_read_csv_batches_in_fixed_size_batches():
+    data = "Crop,Year,rainfall,extra\n" + "".join(f"Wheat,{2000 + i},1.5,x\n" for i in range(5))
+    batches = list(read_csv_batches(io.BytesIO(data.encode()), batch_size=2, plan=PLAN))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert pd.concat(batches)["Year"].tolist() == [2000, 2001, 2002, 2003, 2004]
+
+
+def test_read_csv_batches_survives_a_malformed_line():
+    data = 'Crop,Year\nWheat,2020\nRice,2021\n"Maize,2022\nCotton,2023\n'
+    errors = []
+    source = io.BytesIO(data.encode())
+    batches = list(read_csv_batches(source, batch_size=1, plan=PLAN, on_parse_error=errors.append))
+    rows = pd.concat(batches)
+    # Rows before the bad line are kept once; the unterminated quote swallows the rest
+    assert rows["Crop"].tolist()[:2] == ["Wheat", "Rice"]
+    assert rows["Year"].tolist()[:2] == [2020, 2021]
+    assert len(errors) == 1 and errors[0].startswith("Malformed CSV")
+    # The caller's file object is left open
+    assert not source.closed
+
+
+def test_read_csv_batches_from_path(tmp_path):
+    path = tmp_path / "crops.csv"
+    path.write_text("Crop,expected_revenue\nWheat,lots\nRice,125000\n")
+    invalid = Counter()
+    rows = pd.concat(read_csv_batches(str(path), plan=PLAN, invalid_counts=invalid))
+    assert rows["expected_revenue"].isna().tolist() == [True, False]
+    assert invalid == Counter({"expected_revenue": 1})
+
+
+def test_copy_frames_sends_one_copy_per_batch():
+    conn = FakeConnection()
+    progress = []
+    frames = [
+        PLAN.apply(pd.DataFrame({"Crop": ["Wheat", "Rice"], "Year": ["2020", ""]}, dtype=str)),
+        PLAN.apply(pd.DataFrame({"Crop": [], "Year": []}, dtype=str)),
+        PLAN.apply(pd.DataFrame({"Crop": ['Basmati, "long"'], "Year": ["2021"]}, dtype=str)),
+    ]
+    assert copy_frames(conn, frames, on_batch=progress.append) == 3
+    # Empty batches are skipped
+    assert progress == [2, 3]
+    assert len(conn.copies) == 2
+    sql, payload = conn.copies[0]
+    assert sql.startswith('COPY public.staging_crop_data ("Crop", "Year", "expected_revenue", "rainfall")')
+    # NULL is the empty field, integers keep no decimals
+    assert payload.splitlines() == ["Wheat,2020,,", "Rice,,,"]
+    assert conn.copies[1][1].splitlines() == ['"Basmati, ""long""",2021,,']
+
+
+def test_load_csv_reports_unparseable_columns(tmp_path):
+    path = tmp_path / "crops.csv"
+    path.write_text("Crop,Year,rainfall\nWheat,2020,much\nRice,2021,3.5\n")
+    conn = FakeConnection()
+    rows, errors = load_csv(conn, str(path), batch_size=1)
+    assert rows == 2
+    assert len(conn.copies) == 2
+    assert errors == ["Column rainfall: 1 value(s) could not be converted and were stored as NULL"]
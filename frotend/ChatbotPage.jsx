@@ -4,6 +4,7 @@ import Header from './Header';
 import Footer from './Footer';
 import { useLanguage } from './contexts/LanguageContext';
 import { useNotification } from './contexts/NotificationContext';
+import { streamChat } from './utils/chatStream';
 
 function ChatbotPage({ username, onLogout }) {
   const { t, language: appLanguage } = useLanguage();
@@ -15,14 +16,24 @@ function ChatbotPage({ username, onLogout }) {
   const [chatHistoryByLang, setChatHistoryByLang] = useState({ en: [], ur: [] });
   const [userInput, setUserInput] = useState('');
   const [loading, setLoading] = useState(false);
+  // True once the answer has started streaming in (replaces the "thinking" indicator)
+  const [streaming, setStreaming] = useState(false);
   const [error, setError] = useState(null);
   const [chatbotReady, setChatbotReady] = useState(false);
   const chatEndRef = useRef(null);
   const inputRef = useRef(null);
+  // Pending health re-check while the knowledge base is being built
+  const healthTimerRef = useRef(null);
+  const mountedRef = useRef(false);
 
-  // Check chatbot health on mount
+  // Check chatbot health on mount; stop polling on unmount
   useEffect(() => {
+    mountedRef.current = true;
     checkChatbotHealth();
+    return () => {
+      mountedRef.current = false;
+      clearTimeout(healthTimerRef.current);
+    };
   }, []);
 
   const currentHistory = chatHistoryByLang[chatbotLanguage] || [];
@@ -37,7 +48,12 @@ function ChatbotPage({ username, onLogout }) {
       const response = await fetch('http://127.0.0.1:8000/api/chatbot/health');
       const data = await response.json();
       if (data.status === 'healthy') {
+        setError(null);
         setChatbotReady(true);
+      } else if (data.status === 'initializing') {
+        // Knowledge base is still being built in the background - check again shortly
+        setChatbotReady(false);
+        if (mountedRef.current) healthTimerRef.current = setTimeout(checkChatbotHealth, 3000);
       } else {
         setError(t('chatbot.notAvailable'));
         setChatbotReady(false);
@@ -73,38 +89,50 @@ function ChatbotPage({ username, onLogout }) {
 
     setLoading(true);
 
+    // Answer language is fixed at send time, even if the user switches while it streams
+    const lang = chatbotLanguage;
+    let metadata = null;
+    let started = false;
+    const updateBotMessage = (update) => {
+      setChatHistoryByLang(prev => {
+        const history = prev[lang] || [];
+        const last = history[history.length - 1];
+        // Chat cleared while streaming: nothing to update
+        if (!last || last.role !== 'assistant') return prev;
+        return { ...prev, [lang]: [...history.slice(0, -1), { ...last, ...update(last) }] };
+      });
+    };
+
     try {
-      const response = await fetch('http://127.0.0.1:8000/api/chatbot/chat', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
+      const summary = await streamChat({
+        query,
+        language: lang,
+        requestId: `chat_${Date.now()}`,
+        onMetadata: (data) => {
+          metadata = data;
         },
-        body: JSON.stringify({
-          query: query,
-          language: chatbotLanguage,
-          request_id: `chat_${Date.now()}`
-        })
+        onToken: (text) => {
+          if (!started) {
+            // First token: show the bot message and let it grow as the rest arrives
+            started = true;
+            setStreaming(true);
+            const botMessage = {
+              role: 'assistant',
+              content: text,
+              timestamp: new Date(),
+              contextUsed: metadata?.context_used
+            };
+            setChatHistoryByLang(prev => ({
+              ...prev,
+              [lang]: [...(prev[lang] || []), botMessage]
+            }));
+          } else {
+            updateBotMessage((last) => ({ content: last.content + text }));
+          }
+        }
       });
 
-      if (!response.ok) {
-        const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
-        throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
-      }
-
-      const data = await response.json();
-      
-      // Add bot response to current language's chat history
-      const botMessage = {
-        role: 'assistant',
-        content: data.response,
-        timestamp: new Date(),
-        contextUsed: data.context_used,
-        processingTime: data.processing_time
-      };
-      setChatHistoryByLang(prev => ({
-        ...prev,
-        [chatbotLanguage]: [...(prev[chatbotLanguage] || []), botMessage]
-      }));
+      updateBotMessage(() => ({ processingTime: summary.processing_time }));
 
     } catch (err) {
       console.error('Error sending message:', err);
@@ -119,10 +147,11 @@ function ChatbotPage({ username, onLogout }) {
       };
       setChatHistoryByLang(prev => ({
         ...prev,
-        [chatbotLanguage]: [...(prev[chatbotLanguage] || []), errorMessage]
+        [lang]: [...(prev[lang] || []), errorMessage]
       }));
     } finally {
       setLoading(false);
+      setStreaming(false);
       // Focus input after sending
       setTimeout(() => inputRef.current?.focus(), 100);
     }
@@ -287,7 +316,7 @@ function ChatbotPage({ username, onLogout }) {
                           </div>
                         </div>
                       ))}
-                      {loading && (
+                      {loading && !streaming && (
                         <div className="d-flex justify-content-start mb-3">
                           <div className="bg-white border p-3 rounded-3 shadow-sm">
                             <Spinner animation="border" size="sm" className="me-2" />
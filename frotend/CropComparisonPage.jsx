@@ -48,23 +48,21 @@ function CropComparisonPage({ username, onLogout }) {
       });
   }, []);
 
-  const fetchPrediction = async (cropName) => {
-    const res = await fetch(`http://127.0.0.1:8000/revenue-prediction?crop=${encodeURIComponent(cropName)}&temp=${encodeURIComponent(temp)}`);
+  const fetchPredictions = async (cropNames) => {
+    // Top prediction for every crop in one batch request
+    const params = cropNames
+      .map(cropName => `crop=${encodeURIComponent(cropName)}&temp=${encodeURIComponent(temp)}`)
+      .join('&');
+    const res = await fetch(`http://127.0.0.1:8000/revenue-prediction/batch?${params}&limit=1`);
     const data = await res.json();
-    if (data?.data?.length) {
-      return data.data[0];
-    }
-    return null;
+    return cropNames.map((_, i) => data?.results?.[i]?.data?.[0] || null);
   };
 
   const handleCompare = async () => {
     if (!cropA || !cropB) return;
     setLoading(true);
     try {
-      const [aData, bData] = await Promise.all([
-        fetchPrediction(cropA),
-        fetchPrediction(cropB)
-      ]);
+      const [aData, bData] = await fetchPredictions([cropA, cropB]);
 
       setComparison({
         a: aData,
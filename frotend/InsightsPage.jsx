@@ -44,12 +44,12 @@ function InsightsPage({ username, onLogout }) {
     
     setLoading(true);
     try {
-      // Fetch data for all temperature categories
-      const [best, average, worst] = await Promise.all([
-        fetch(`http://127.0.0.1:8000/revenue-prediction?crop=${encodeURIComponent(selectedCrop)}&temp=Best`).then(r => r.json()),
-        fetch(`http://127.0.0.1:8000/revenue-prediction?crop=${encodeURIComponent(selectedCrop)}&temp=Average`).then(r => r.json()),
-        fetch(`http://127.0.0.1:8000/revenue-prediction?crop=${encodeURIComponent(selectedCrop)}&temp=Worst`).then(r => r.json())
-      ]);
+      // Fetch data for all temperature categories in one batch request
+      const crop = encodeURIComponent(selectedCrop);
+      const batch = await fetch(
+        `http://127.0.0.1:8000/revenue-prediction/batch?crop=${crop}&temp=Best&crop=${crop}&temp=Average&crop=${crop}&temp=Worst`
+      ).then(r => r.json());
+      const [best, average, worst] = batch.results && batch.results.length === 3 ? batch.results : [{}, {}, {}];
 
       // Process insights
       const processData = (data) => {
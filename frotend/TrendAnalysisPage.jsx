@@ -41,9 +41,7 @@ function TrendAnalysisPage({ username, onLogout }) {
       });
   }, []);
 
-  const fetchTempData = async (temp) => {
-    const res = await fetch(`http://127.0.0.1:8000/revenue-prediction?crop=${encodeURIComponent(selectedCrop)}&temp=${encodeURIComponent(temp)}`);
-    const data = await res.json();
+  const toTrendItem = (temp, data) => {
     if (data?.data?.length) {
       const item = data.data[0];
       return {
@@ -65,7 +63,13 @@ function TrendAnalysisPage({ username, onLogout }) {
     if (!selectedCrop) return;
     setLoading(true);
     try {
-      const results = await Promise.all(TEMP_OPTIONS.map(fetchTempData));
+      // One batch request for every temperature category (only the top row is used)
+      const params = TEMP_OPTIONS
+        .map(temp => `crop=${encodeURIComponent(selectedCrop)}&temp=${encodeURIComponent(temp)}`)
+        .join('&');
+      const res = await fetch(`http://127.0.0.1:8000/revenue-prediction/batch?${params}&limit=1`);
+      const data = await res.json();
+      const results = (data.results || []).map(entry => toTrendItem(entry.temp, entry));
       setTrendData(results.filter(Boolean));
     } catch (err) {
       console.error('Trend fetch error', err);
@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import { Button, Dropdown, DropdownButton } from 'react-bootstrap';
 import { useFavorites } from '../contexts/FavoritesContext.jsx';
 import { useNotification } from '../contexts/NotificationContext.jsx';
-import { exportToPDF } from '../utils/exportUtils.js';
+import { exportDataset, exportToPDF } from '../utils/exportUtils.js';
 import { shareToSocial, copyToClipboard } from '../utils/shareUtils.js';
 
 function ActionButtons({ item, type = 'crop' }) {
@@ -43,6 +43,12 @@ function ActionButtons({ item, type = 'crop' }) {
     showNotification('Exporting to PDF...', 'info');
   };
 
+  // All staging rows of this item's crop, streamed by the backend
+  const handleExportData = (format) => {
+    exportDataset('staging', format, { crop: item.crop_name });
+    showNotification(`Exporting ${item.crop_name} data as ${format.toUpperCase()}...`, 'info');
+  };
+
   const handleShare = (platform) => {
     const shareData = {
       title: `ClimaCrop: ${item.variety || item.crop_name || 'Crop Analysis'}`,
@@ -72,14 +78,26 @@ function ActionButtons({ item, type = 'crop' }) {
         {favorited ? '⭐' : '☆'} Favorite
       </Button>
       
-      <Button
+      <DropdownButton
         variant="outline-primary"
         size="sm"
-        onClick={handleExport}
-        title="Export to PDF"
+        title="📄 Export"
       >
-        📄 Export
-      </Button>
+        <Dropdown.Item onClick={handleExport}>
+          📄 PDF Report
+        </Dropdown.Item>
+        {item.crop_name && (
+          <>
+            <Dropdown.Divider />
+            <Dropdown.Item onClick={() => handleExportData('csv')}>
+              📊 {item.crop_name} Data (CSV)
+            </Dropdown.Item>
+            <Dropdown.Item onClick={() => handleExportData('parquet')}>
+              🗃️ {item.crop_name} Data (Parquet)
+            </Dropdown.Item>
+          </>
+        )}
+      </DropdownButton>
 
       <DropdownButton
         variant="outline-info"
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import { Card, Button, Form, Spinner } from 'react-bootstrap';
 import { Link } from 'react-router-dom';
 import { useLanguage } from '../contexts/LanguageContext';
+import { streamChat } from '../utils/chatStream';
 
 function ChatbotWidget({ username }) {
   const { t } = useLanguage();
@@ -10,11 +11,22 @@ function ChatbotWidget({ username }) {
   const [chatHistoryByLang, setChatHistoryByLang] = useState({ en: [], ur: [] });
   const [userInput, setUserInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const [chatbotReady, setChatbotReady] = useState(false);
   const chatEndRef = useRef(null);
+  // Pending health re-check while the knowledge base is being built
+  const healthTimerRef = useRef(null);
+  const pollingRef = useRef(false);
 
+  // Check health while the widget is open; stop polling when it closes or unmounts
   useEffect(() => {
-    if (open) checkChatbotHealth();
+    if (!open) return;
+    pollingRef.current = true;
+    checkChatbotHealth();
+    return () => {
+      pollingRef.current = false;
+      clearTimeout(healthTimerRef.current);
+    };
   }, [open]);
 
   const currentHistory = chatHistoryByLang[chatbotLanguage] || [];
@@ -28,6 +40,10 @@ function ChatbotWidget({ username }) {
       const res = await fetch('http://127.0.0.1:8000/api/chatbot/health');
       const data = await res.json();
       setChatbotReady(data.status === 'healthy');
+      // Still building in the background - check again shortly
+      if (data.status === 'initializing' && pollingRef.current) {
+        healthTimerRef.current = setTimeout(checkChatbotHealth, 3000);
+      }
     } catch {
       setChatbotReady(false);
     }
@@ -43,27 +59,37 @@ function ChatbotWidget({ username }) {
       [chatbotLanguage]: [...(prev[chatbotLanguage] || []), { role: 'user', content: query }]
     }));
     setLoading(true);
+    // Answer language is fixed at send time; the bot message grows as tokens stream in
+    const lang = chatbotLanguage;
+    let started = false;
     try {
-      const res = await fetch('http://127.0.0.1:8000/api/chatbot/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ query, language: chatbotLanguage, request_id: `widget_${Date.now()}` })
+      await streamChat({
+        query,
+        language: lang,
+        requestId: `widget_${Date.now()}`,
+        onToken: (text) => {
+          const first = !started;
+          started = true;
+          setStreaming(true);
+          setChatHistoryByLang(prev => {
+            const history = prev[lang] || [];
+            if (first) {
+              return { ...prev, [lang]: [...history, { role: 'assistant', content: text }] };
+            }
+            const last = history[history.length - 1];
+            if (!last || last.role !== 'assistant') return prev;
+            return { ...prev, [lang]: [...history.slice(0, -1), { ...last, content: last.content + text }] };
+          });
+        }
       });
-      const data = await res.json();
-      const botMsg = res.ok
-        ? { role: 'assistant', content: data.response }
-        : { role: 'assistant', content: data.detail || 'Error', isError: true };
-      setChatHistoryByLang(prev => ({
-        ...prev,
-        [chatbotLanguage]: [...(prev[chatbotLanguage] || []), botMsg]
-      }));
     } catch (err) {
       setChatHistoryByLang(prev => ({
         ...prev,
-        [chatbotLanguage]: [...(prev[chatbotLanguage] || []), { role: 'assistant', content: err.message || 'Connection error', isError: true }]
+        [lang]: [...(prev[lang] || []), { role: 'assistant', content: err.message || 'Connection error', isError: true }]
       }));
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -121,7 +147,7 @@ function ChatbotWidget({ username }) {
                   </div>
                 ))
               )}
-              {loading && (
+              {loading && !streaming && (
                 <div className="small text-muted">
                   <Spinner animation="border" size="sm" className="me-1" />
                   {t('chatbot.thinking')}...
@@ -0,0 +1,55 @@
+// Streaming chatbot answers: POST /api/chatbot/chat/stream and read its server-sent events
+// (EventSource only supports GET, so the stream is read from fetch)
+export const streamChat = async ({ query, language, requestId, onMetadata, onToken }) => {
+  const response = await fetch('http://127.0.0.1:8000/api/chatbot/chat/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ query, language, request_id: requestId })
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ detail: 'Unknown error' }));
+    throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        frame.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        const payload = data ? JSON.parse(data) : {};
+
+        if (event === 'metadata') onMetadata?.(payload);
+        else if (event === 'token') onToken?.(payload.text);
+        else if (event === 'done') summary = payload;
+        else if (event === 'error') throw new Error(payload.detail || 'Error');
+        else if (event === 'cancelled') throw new Error(payload.detail || 'Request cancelled');
+      }
+    }
+  } finally {
+    reader.cancel().catch(() => {});
+  }
+
+  if (!summary) {
+    throw new Error('Connection closed before the response finished');
+  }
+  return summary;
+};
@@ -76,6 +76,22 @@ export const exportChartAsImage = (chartId, filename = 'chart') => {
   }
 };
 
+// Bulk export streamed by the backend (not limited to what a page downloaded)
+// dataset: 'staging' | 'warehouse', format: 'csv' | 'ndjson' | 'parquet'
+// filters: { crop: [...], district: [...], year: [...] }
+export const exportDataset = (dataset = 'staging', format = 'csv', filters = {}) => {
+  const params = new URLSearchParams({ format });
+  Object.entries(filters).forEach(([key, values]) => {
+    [].concat(values || []).forEach(value => params.append(key, value));
+  });
+
+  // Let the browser download the stream straight to disk
+  const link = document.createElement('a');
+  link.href = `http://127.0.0.1:8000/export/${encodeURIComponent(dataset)}?${params.toString()}`;
+  link.download = `climacrop_${dataset}.${format}`;
+  link.click();
+};
+
 
 
 
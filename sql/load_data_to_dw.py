@@ -5,12 +5,16 @@ Usage: python3 load_data_to_dw.py
 Database connection parameters are loaded from environment variables or .env file
 """
 
-import csv
 import psycopg2
-from psycopg2.extras import execute_values
 import os
 import sys
 
+# Staging schema, conversion plan and COPY loader are shared with the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from staging import STAGING_MIGRATIONS, STAGING_TABLE_DDL, load_csv
+from indexes import ANALYZED_TABLES, INDEX_DEFINITIONS, index_ddl
+from rollups import CROP_STATISTICS_FULL_REFRESH
+
 # Try to load dotenv if available
 try:
     from dotenv import load_dotenv
@@ -58,52 +62,10 @@ def create_schema(conn):
         # Create schema
         cursor.execute("CREATE SCHEMA IF NOT EXISTS climatecrop;")
         
-        # Create staging table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS public.staging_crop_data (
-                "Avg_Price_per_kg" FLOAT,
-                "Avg_Yield_maunds_per_acre" FLOAT,
-                "Area_acres" FLOAT,
-                "Year" INT,
-                "Max_Price_PKR" FLOAT,
-                "expected_effect" FLOAT,
-                "Avg_Yield_kg_per_acre" FLOAT,
-                "Min_Price_PKR" FLOAT,
-                "climate_impact_score" FLOAT,
-                "expected_revenue" BIGINT,
-                "Crop" TEXT,
-                "ph" FLOAT,
-                "Avg_Price_PKR" FLOAT,
-                "N" FLOAT,
-                "K" FLOAT,
-                "revenue_norm" FLOAT,
-                "expected_risk" TEXT,
-                "temperature" TEXT,
-                "Fertilizer_Type" TEXT,
-                "climate_effect_percent" FLOAT,
-                "Production_kg" BIGINT,
-                "temperature_norm" FLOAT,
-                "rainfall" FLOAT,
-                "humidity" FLOAT,
-                "Decision_Tree_Predicted_Revenue" BIGINT,
-                "Total_Revenue_PKR" BIGINT,
-                "XGBoost_Tuned_Predicted_Revenue" BIGINT,
-                "Expected_Disease" TEXT,
-                "climate_score" FLOAT,
-                "Season" TEXT,
-                "Temperature_Category" TEXT,
-                "Soil_Type" TEXT,
-                "Production_tons_Copy" FLOAT,
-                "P" FLOAT,
-                "XGBoost_Predicted_Revenue" BIGINT,
-                "rainfall_norm" FLOAT,
-                "climate_risk_level" TEXT,
-                "Random_Forest_Predicted_Revenue" BIGINT,
-                "district" TEXT,
-                "Recommended_Pesticide" TEXT,
-                "Variety" TEXT
-            );
-        """)
+        # Create staging table (column layout shared with the backend loaders)
+        cursor.execute(STAGING_TABLE_DDL)
+        for statement in STAGING_MIGRATIONS:
+            cursor.execute(statement)
         
         # Create dimension tables
         cursor.execute("""
@@ -164,166 +126,23 @@ def create_schema(conn):
 # Load CSV Data
 # ========================================
 def load_csv_data(conn):
-    cursor = conn.cursor()
-    
     if not os.path.exists(CSV_FILE):
         print(f"✗ Error: CSV file '{CSV_FILE}' not found")
         sys.exit(1)
     
-    # Map CSV columns to staging table columns
-    # Note: CSV has 'c' as first column (skipped) and doesn't have 'Avg_Price_per_kg'
-    column_mapping = {
-        "Avg_Price_per_kg": None,  # Not in CSV, will be NULL
-        "Avg_Yield_maunds_per_acre": "Avg_Yield_maunds_per_acre",
-        "Area_acres": "Area_acres",
-        "Year": "Year",
-        "Max_Price_PKR": "Max_Price_PKR",
-        "expected_effect": "expected_effect",
-        "Avg_Yield_kg_per_acre": "Avg_Yield_kg_per_acre",
-        "Min_Price_PKR": "Min_Price_PKR",
-        "climate_impact_score": "climate_impact_score",
-        "expected_revenue": "expected_revenue",
-        "Crop": "Crop",
-        "ph": "ph",
-        "Avg_Price_PKR": "Avg_Price_PKR",
-        "N": "N",
-        "K": "K",
-        "revenue_norm": "revenue_norm",
-        "expected_risk": "expected_risk",
-        "temperature": "temperature",
-        "Fertilizer_Type": "Fertilizer_Type",
-        "climate_effect_percent": "climate_effect_percent",
-        "Production_kg": "Production_kg",
-        "temperature_norm": "temperature_norm",
-        "rainfall": "rainfall",
-        "humidity": "humidity",
-        "Decision_Tree_Predicted_Revenue": "Decision_Tree_Predicted_Revenue",
-        "Total_Revenue_PKR": "Total_Revenue_PKR",
-        "XGBoost_Tuned_Predicted_Revenue": "XGBoost_Tuned_Predicted_Revenue",
-        "Expected_Disease": "Expected_Disease",
-        "climate_score": "climate_score",
-        "Season": "Season",
-        "Temperature_Category": "Temperature_Category",
-        "Soil_Type": "Soil_Type",
-        "Production_tons_Copy": "Production_tons_Copy",
-        "P": "P",
-        "XGBoost_Predicted_Revenue": "XGBoost_Predicted_Revenue",
-        "rainfall_norm": "rainfall_norm",
-        "climate_risk_level": "climate_risk_level",
-        "Random_Forest_Predicted_Revenue": "Random_Forest_Predicted_Revenue",
-        "district": "district",
-        "Recommended_Pesticide": "Recommended_Pesticide",
-        "Variety": "Variety"
-    }
-    
-    # Define data types for each column to ensure proper conversion
-    column_types = {
-        "Avg_Price_per_kg": float,
-        "Avg_Yield_maunds_per_acre": float,
-        "Area_acres": float,
-        "Year": int,
-        "Max_Price_PKR": float,
-        "expected_effect": float,
-        "Avg_Yield_kg_per_acre": float,
-        "Min_Price_PKR": float,
-        "climate_impact_score": float,
-        "expected_revenue": int,
-        "Crop": str,
-        "ph": float,
-        "Avg_Price_PKR": float,
-        "N": float,
-        "K": float,
-        "revenue_norm": float,
-        "expected_risk": str,  # TEXT - contains "Medium", "Low", etc.
-        "temperature": str,  # TEXT - numeric as string
-        "Fertilizer_Type": str,
-        "climate_effect_percent": float,
-        "Production_kg": int,
-        "temperature_norm": float,
-        "rainfall": float,
-        "humidity": float,
-        "Decision_Tree_Predicted_Revenue": int,
-        "Total_Revenue_PKR": int,
-        "XGBoost_Tuned_Predicted_Revenue": int,
-        "Expected_Disease": str,
-        "climate_score": float,
-        "Season": str,
-        "Temperature_Category": str,
-        "Soil_Type": str,
-        "Production_tons_Copy": float,
-        "P": float,
-        "XGBoost_Predicted_Revenue": int,
-        "rainfall_norm": float,
-        "climate_risk_level": str,
-        "Random_Forest_Predicted_Revenue": int,
-        "district": str,
-        "Recommended_Pesticide": str,
-        "Variety": str
-    }
-    
-    def convert_value(value, target_type):
-        """Convert value to target type, handling None and empty strings"""
-        if value is None or value == '':
-            return None
-        
-        try:
-            if target_type == int:
-                # Try to convert to int, handle floats
-                try:
-                    return int(float(value))
-                except (ValueError, TypeError):
-                    return None
-            elif target_type == float:
-                try:
-                    return float(value)
-                except (ValueError, TypeError):
-                    return None
-            elif target_type == str:
-                return str(value).strip()
-            else:
-                return value
-        except Exception:
-            return None
-    
-    staging_columns = list(column_mapping.keys())
-    insert_query = f"""
-        INSERT INTO public.staging_crop_data ({', '.join(['"' + col + '"' for col in staging_columns])})
-        VALUES %s
-    """
-    
+    # Columns are converted with the backend's shared staging conversion plan
+    # (one vectorized converter per staging column) and bulk loaded with COPY
     try:
-        row_count = 0
-        with open(CSV_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            rows = []
-            
-            for row in reader:
-                # Map CSV values to staging table columns with proper type conversion
-                values = []
-                for staging_col, csv_col in column_mapping.items():
-                    if csv_col is None:
-                        values.append(None)  # Column not in CSV
-                    else:
-                        value = row.get(csv_col, None)
-                        target_type = column_types.get(staging_col, str)
-                        converted_value = convert_value(value, target_type)
-                        values.append(converted_value)
-                rows.append(tuple(values))
-                
-                # Batch insert every 1000 rows
-                if len(rows) >= 1000:
-                    execute_values(cursor, insert_query, rows)
-                    row_count += len(rows)
-                    rows = []
-                    print(f"  Loaded {row_count} rows...", end='\r')
-            
-            # Insert remaining rows
-            if rows:
-                execute_values(cursor, insert_query, rows)
-                row_count += len(rows)
+        row_count, errors = load_csv(
+            conn,
+            CSV_FILE,
+            on_batch=lambda total: print(f"  Loaded {total} rows...", end='\r')
+        )
         
         conn.commit()
         print(f"\n✓ Loaded {row_count} rows into staging table")
+        for error in errors:
+            print(f"  ⚠ {error}")
         
     except Exception as e:
         conn.rollback()
@@ -337,16 +156,21 @@ def populate_dimensions(conn):
     cursor = conn.cursor()
     
     try:
+        # One member per dimension key, the same key the unique idx_dim_*_key indexes
+        # and the fact joins use (NULL and '' are the same member). Other attributes
+        # are folded with MAX, as refresh_dw in backend/main.py does
         # Populate dim_crop
         cursor.execute("""
             INSERT INTO climatecrop.dim_crop(crop_name, variety, fertilizer_type, recommended_pesticide)
-            SELECT DISTINCT 
+            SELECT 
                 "Crop", 
-                "Variety", 
-                "Fertilizer_Type", 
-                "Recommended_Pesticide"
+                MAX("Variety") as variety, 
+                MAX("Fertilizer_Type") as fertilizer_type, 
+                MAX("Recommended_Pesticide") as recommended_pesticide
             FROM public.staging_crop_data
-            WHERE "Crop" IS NOT NULL;
+            WHERE "Crop" IS NOT NULL
+            GROUP BY "Crop", COALESCE("Variety", '')
+            ON CONFLICT DO NOTHING;
         """)
         crop_count = cursor.rowcount
         print(f"✓ Populated dim_crop with {crop_count} rows")
@@ -354,11 +178,13 @@ def populate_dimensions(conn):
         # Populate dim_location
         cursor.execute("""
             INSERT INTO climatecrop.dim_location(district, soil_type)
-            SELECT DISTINCT 
+            SELECT 
                 "district", 
-                "Soil_Type"
+                MAX("Soil_Type") as soil_type
             FROM public.staging_crop_data
-            WHERE "district" IS NOT NULL;
+            WHERE "district" IS NOT NULL
+            GROUP BY "district", COALESCE("Soil_Type", '')
+            ON CONFLICT DO NOTHING;
         """)
         location_count = cursor.rowcount
         print(f"✓ Populated dim_location with {location_count} rows")
@@ -366,11 +192,13 @@ def populate_dimensions(conn):
         # Populate dim_time
         cursor.execute("""
             INSERT INTO climatecrop.dim_time(year, season)
-            SELECT DISTINCT 
+            SELECT 
                 "Year", 
-                "Season"
+                MAX("Season") as season
             FROM public.staging_crop_data
-            WHERE "Year" IS NOT NULL;
+            WHERE "Year" IS NOT NULL
+            GROUP BY "Year", COALESCE("Season", '')
+            ON CONFLICT DO NOTHING;
         """)
         time_count = cursor.rowcount
         print(f"✓ Populated dim_time with {time_count} rows")
@@ -431,6 +259,43 @@ def populate_fact_table(conn):
         print(f"✗ Error populating fact table: {e}")
         raise
 
+# ========================================
+# Populate Rollups
+# ========================================
+def populate_rollups(conn):
+    cursor = conn.cursor()
+    
+    try:
+        for statement in CROP_STATISTICS_FULL_REFRESH:
+            cursor.execute(statement)
+        rollup_count = cursor.rowcount
+        conn.commit()
+        print(f"✓ Populated crop_statistics rollup with {rollup_count} rows")
+        
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"✗ Error populating rollups: {e}")
+        raise
+
+# ========================================
+# Create Indexes (one per API query shape)
+# ========================================
+def create_indexes(conn):
+    cursor = conn.cursor()
+    
+    try:
+        for index in INDEX_DEFINITIONS:
+            cursor.execute(index_ddl(index))
+        for table in ANALYZED_TABLES:
+            cursor.execute(f"ANALYZE {table};")
+        conn.commit()
+        print(f"✓ Created {len(INDEX_DEFINITIONS)} indexes")
+        
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"✗ Error creating indexes: {e}")
+        raise
+
 # ========================================
 # Verify Data Load and Provide Insights
 # ========================================
@@ -581,23 +446,28 @@ def main():
     
     try:
         # Step 1: Create schema and tables
-        print("\n[1/5] Creating schema and tables...")
+        print("\n[1/6] Creating schema and tables...")
         create_schema(conn)
         
         # Step 2: Load CSV data
-        print("\n[2/5] Loading CSV data into staging table...")
+        print("\n[2/6] Loading CSV data into staging table...")
         load_csv_data(conn)
         
         # Step 3: Populate dimension tables
-        print("\n[3/5] Populating dimension tables...")
+        print("\n[3/6] Populating dimension tables...")
         populate_dimensions(conn)
         
-        # Step 4: Populate fact table
-        print("\n[4/5] Populating fact table...")
+        # Step 4: Populate fact table and rollups
+        print("\n[4/6] Populating fact table and rollups...")
         populate_fact_table(conn)
+        populate_rollups(conn)
+        
+        # Step 5: Create indexes after the bulk load
+        print("\n[5/6] Creating indexes...")
+        create_indexes(conn)
         
-        # Step 5: Verify data
-        print("\n[5/5] Verifying data load...")
+        # Step 6: Verify data
+        print("\n[6/6] Verifying data load...")
         verify_data(conn)
         
         print("\n✓ Data load completed successfully!")